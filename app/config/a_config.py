@@ -42,8 +42,8 @@ class AnfisaConfig:
         "report.lines": 100,
 
         "ws.max.count":  9000,
-        "export.max.count": 300,
-        "tab.max.count": 9000,  # 50,
+        "export.max.count": 10000,
+        "tab.max.count": 30000,
 
         "ds.name.max.length": 255,
         "tag.name.max.length": 255,
@@ -73,16 +73,37 @@ class AnfisaConfig:
         "transcript.path.base": "/_view/transcripts",
 
         "ws.transcript.id": "Transcript_id",
+        "ws.snapshot": True,
+        "ws.atom.cache.mem": 128 * 1024 * 1024,
+        "ws.zyg.cache.mem": 64 * 1024 * 1024,
+        "region.max.loci": 10000,
 
         "job.pool.size":    50,
         "job.pool.threads": 10,
         "job.pool.memlen":  100,
 
+        "stat.pool.threads": 4,
+        "eval.cache.size": 32,
+
+        "mongo.bulk.portion": 1000,
+
+        "create.chunk.size": 2000,
+
+        "vdata.cache.mem": 64 * 1024 * 1024,
+        "genes.info.cache.size": 1000,
+
+        "druid.cache.size": 1000,
+        "druid.cache.ttl":  600,
+        "xl.num.stat.cache.size": 16,
+        "xl.scan.page.size": 20000,
+
         "long.run.passtime": timedelta(minutes = 10),
         "long.run.failures": 5,
+        "long.run.threads": 4,
+        "long.run.pool.threads": 16,
 
         "variety.max.rest.size": 300,
-        "comp-hets.cache.size": 10,
+        "comp-hets.cache.mem": 64 * 1024 * 1024,
 
         "max.gene.comp.count": 10000}
 
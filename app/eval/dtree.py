@@ -84,6 +84,8 @@ class CheckPoint:
         self.mFrag = frag
         self.mPointNo = story.getCurPointNo()
         self.mPrevPoint = prev_point
+        self.mAccumCondition = None
+        self.mActualCondition = None
         assert self.mFrag.getLevel() == self.mStory.getLevel()
         assert (self.mPrevPoint is None
             or self.mPrevPoint.getPointKind() == "If")
@@ -122,13 +124,23 @@ class CheckPoint:
         return []
 
     def _accumulateConditions(self):
-        if self.getPrevPoint() is None:
-            return self.mCondition
-        assert self.getPrevPoint().getLevel() == self.getLevel()
-        return self.getPrevPoint()._accumulateConditions().addOr(
-            self.mCondition)
+        # conditions of points are final after activation,
+        # so each point extends accumulation of previous one
+        if self.mAccumCondition is None:
+            if self.getPrevPoint() is None:
+                self.mAccumCondition = self.mCondition
+            else:
+                assert self.getPrevPoint().getLevel() == self.getLevel()
+                self.mAccumCondition = (self.getPrevPoint().
+                    _accumulateConditions().addOr(self.mCondition))
+        return self.mAccumCondition
 
     def actualCondition(self):
+        if self.mActualCondition is None:
+            self.mActualCondition = self._evalActualCondition()
+        return self.mActualCondition
+
+    def _evalActualCondition(self):
         if self.getPrevPoint() is None:
             return self.getStory().getMaster().getEvalSpace().getCondAll()
         return self.getPrevPoint()._accumulateConditions().negative()
@@ -188,7 +200,7 @@ class TerminalPoint(CheckPoint):
             return self.getPrevPoint().isActive()
         return True
 
-    def actualCondition(self):
+    def _evalActualCondition(self):
         if self.getPrevPoint() is None:
             return self.getStory().getMaster().getEvalSpace().getCondAll()
         if self.getPrevPoint().getLevel() == self.getLevel():
@@ -106,6 +106,17 @@ class CondAtomInfo:
 
 #===============================================
 class ParsedDTree:
+    @staticmethod
+    def _codeHash(norm_code):
+        hash_h = md5()
+        hash_h.update(bytes(norm_code, "utf-8"))
+        return hash_h.hexdigest()
+
+    @classmethod
+    def evalHashCode(cls, dtree_code):
+        # hash code of tree without parsing
+        return cls._codeHash(normalizeCode(dtree_code))
+
     def __init__(self, eval_space, dtree_code):
         self.mEvalSpace = eval_space
         self.mFragments = []
@@ -148,9 +159,7 @@ class ParsedDTree:
                 if self.mFirstError is None:
                     self.mFirstError = err_info
             self.mFragments += fragments
-        hash_h = md5()
-        hash_h.update(bytes(self.mCode, "utf-8"))
-        self.mHashCode = hash_h.hexdigest()
+        self.mHashCode = self._codeHash(self.mCode)
         self.mCurLineDiap = None
         self.mError = None
         self.mCondAtoms = None
@@ -50,6 +50,15 @@ class EvalSpace:
     def iterFunctions(self):
         return iter(self.mFunctions)
 
+    def buildAtomCondition(self, unit_h, cond_data, eval_h):
+        return unit_h.buildCondition(cond_data, eval_h)
+
+    def condMemSize(self, condition):
+        return len(json.dumps(condition.toJSon()))
+
+    def condContentKey(self, condition):
+        return condition.hashCode()
+
     def _addUnit(self, unit_h, force_it = False):
         if unit_h.getMean() == "pre-variety":
             self._addReservedUnit(unit_h)
@@ -115,6 +124,29 @@ class EvalSpace:
             ret = ret.addAnd(cond)
         return ret
 
+    def getGeneIndex(self, unit_h):
+        return None
+
+    def makeRegionCond(self, map_units, loci):
+        seq = []
+        for chrom, start, end in loci:
+            cond = self.makeEnumCond(self.getUnit(map_units["chrom"]),
+                [chrom])
+            if start is not None:
+                cond = self.joinAnd([cond,
+                    self.makeNumericCond(self.getUnit(map_units["start"]),
+                        min_val = start, min_eq = True),
+                    self.makeNumericCond(self.getUnit(map_units["end"]),
+                        max_val = end, max_eq = True)])
+            seq.append(cond)
+        return self.joinOr(seq)
+
+    def makeZygScenarioCond(self, scenario_seq):
+        return self.joinAnd([
+            self.makeNumericCond(self.getZygUnit(idx), zyg_bounds = zyg_bounds)
+            for zyg_bounds, sample_idxs in scenario_seq
+            for idx in sample_idxs])
+
     def joinOr(self, seq):
         ret = self.getCondNone()
         for cond in seq:
@@ -165,6 +165,9 @@ class Evaluation(SolutionBaseInfo):
             if err_msg:
                 self.pointError(err_msg)
                 return None
+        if unit_h.isCondCacheable():
+            return self.mEvalSpace.buildAtomCondition(
+                unit_h, cond_data, self)
         return unit_h.buildCondition(cond_data, self)
 
     def getUsedEnumValues(self, unit_name):
@@ -32,8 +32,7 @@ class FilterEval(Evaluation):
     def __init__(self, eval_space, cond_data_seq, name = None,
             rubric = None, updated_time = None, updated_from = None):
         Evaluation.__init__(self, "filter", eval_space,
-            md5(bytes(json.dumps(cond_data_seq, sort_keys = True),
-                encoding = "utf-8")).hexdigest(),
+            self.evalHashCode(cond_data_seq),
             name, rubric, updated_time, updated_from)
         self.mCondDataSeq = cond_data_seq
         self.mPresentation = []
@@ -49,6 +48,11 @@ class FilterEval(Evaluation):
                 self.mPresentation.append(formatConditionCode(cond_data))
         self.mCondition = None
 
+    @staticmethod
+    def evalHashCode(cond_data_seq):
+        return md5(bytes(json.dumps(cond_data_seq, sort_keys = True),
+            encoding = "utf-8")).hexdigest()
+
     @staticmethod
     def makeSolEntry(eval_space, info):
         assert info["_tp"] == "filter"
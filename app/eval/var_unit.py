@@ -108,6 +108,9 @@ class VarUnit:
     def isTranscriptID(self):
         return False
 
+    def isCondCacheable(self):
+        return True
+
 # ===============================================
 # ===============================================
 
@@ -151,6 +154,9 @@ class ComplexEnumUnit(VarUnit, EnumUnitSupport):
     def iterComplexCriteria(self, context=None, variants=None):
         pass
 
+    def isCondCacheable(self):
+        return False
+
     def collectComplexStat(self, ret_handle, base_condition,
                            context=None, detailed=False):
         val_stat_list = []
@@ -234,3 +240,6 @@ class ReservedNumUnit(NumUnitSupport):
     def getSubKind(self):
         return self.mSubKind
 
+    def isCondCacheable(self):
+        return True
+
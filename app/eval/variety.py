@@ -295,6 +295,9 @@ class VarietyPanelUnit(VarUnit):
     def getVariety(self):
         return self.mVariety
 
+    def isCondCacheable(self):
+        return False
+
     def getVariantSet(self):
         return VariantSet([pname
                            for pname, _ in self.mVariety.iterPanels()])
@@ -17,11 +17,6 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-import json
-from cachetools import LRUCache
-from hashlib import md5
-
-from app.config.a_config import AnfisaConfig
 from app.eval.var_unit import FunctionUnit
 # =====================================
 
@@ -39,8 +34,6 @@ class CompHetsUnit(FunctionUnit):
             self, ds_h.getEvalSpace(), descr,
             sub_kind="comp-hets", parameters=["approx", "state"])
         self.mZygSupport = ds_h.getZygositySupport()
-        self.mOpCache = LRUCache(
-            AnfisaConfig.configOption("comp-hets.cache.size"))
 
     def _buildTrioRequest(self, trio_info,  approx_mode,  actual_condition):
         id_base,  id_father,  id_mother = trio_info[1:]
@@ -90,16 +83,13 @@ class CompHetsUnit(FunctionUnit):
         if approx_mode is False:
             return None, f"Improper approx mode {parameters['approx']}"
 
-        build_id = approx_mode + '|' + actual_condition.hashCode()
-        with self.getEvalSpace().getDS():
-            context = self.mOpCache.get(build_id)
-        if context is None:
-            context = {
-                "approx": approx_mode,
-                "trio-dict": self.buildConditions(
-                    approx_mode, actual_condition)}
-            with self.getEvalSpace().getDS():
-                self.mOpCache[build_id] = context
+        def build_f():
+            trio_dict = self.buildConditions(approx_mode, actual_condition)
+            return ({"approx": approx_mode, "trio-dict": trio_dict},
+                trio_dict.values())
+
+        context = self.mZygSupport.getCompoundContext(self.getSubKind(),
+            approx_mode, actual_condition, build_f)
         if None in context["trio-dict"].values():
             return context, "Too heavy condition"
         return context, None
@@ -149,8 +139,6 @@ class CompoundRequestUnit(FunctionUnit):
                               sub_kind="comp-request",
                               parameters=["request", "approx", "state"])
         self.mZygSupport = ds_h.getZygositySupport()
-        self.mOpCache = LRUCache(
-            AnfisaConfig.configOption("comp-hets.cache.size"))
 
     def iterComplexCriteria(self, context, variants=None):
         if context is None:
@@ -183,19 +171,13 @@ class CompoundRequestUnit(FunctionUnit):
         if self.mZygSupport.emptyRequest(c_rq):
             return None, "Empty request"
 
-        build_id = md5(bytes(json.dumps(c_rq, sort_keys=True)
-                             + approx_mode + '|' + actual_condition.hashCode(),
-                             encoding="utf-8")).hexdigest()
-        with self.getEvalSpace().getDS():
-            context = self.mOpCache.get(build_id)
-        context = None
-        if context is None:
-            context = {
-                "approx": approx_mode,
-                "crit": self.mZygSupport.makeCompoundRequest(
-                    approx_mode, actual_condition, c_rq, self.getName())}
-            with self.getEvalSpace().getDS():
-                self.mOpCache[build_id] = context
+        def build_f():
+            crit = self.mZygSupport.makeCompoundRequest(
+                approx_mode, actual_condition, c_rq, self.getName())
+            return {"approx": approx_mode, "crit": crit}, [crit]
+
+        context = self.mZygSupport.getCompoundContext(self.getSubKind(),
+            [approx_mode, c_rq], actual_condition, build_f)
         if context["crit"] is None:
             return context, "Too heavy condition"
         return context, None
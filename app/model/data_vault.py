@@ -201,6 +201,8 @@ class DataVault(SyncronizedObject):
                 + ds_h.getDSKind() + " vs. " + ds_kind)
             del self.mDataSets[ds_name]
             self.mIntVersion += 1
+        if ds_h.getDSKind() == "xl":
+            self.mApp.getDruidAgent().dropDataSetCache(ds_name)
 
     def getSecondaryWSNames(self, ds_h):
         ret = []
@@ -370,6 +372,18 @@ class DataVault(SyncronizedObject):
                 print('\t---')
             print("======", file = rep)
             logging.warning(rep.getvalue())
+        if "stat" in rq_args:
+            with self:
+                ds_seq = list(self.mDataSets.values())
+            comp_stat = dict()
+            for ds_h in ds_seq:
+                zyg_support = ds_h.getZygositySupport()
+                if zyg_support is not None:
+                    comp_stat[ds_h.getName()] = (
+                        zyg_support.reportCompoundCacheStat())
+            return {
+                "druid-cache": self.mApp.getDruidAgent().reportCacheStat(),
+                "comp-cache": comp_stat}
         return "OK"
 
     #===============================================
@@ -20,6 +20,9 @@
 
 import json, abc
 from datetime import datetime, timedelta
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
+from cachetools import LRUCache
 from xml.sax.saxutils import escape
 
 from app.view.asp_set import AspectSetH
@@ -40,13 +43,14 @@ from .sol_broker import SolutionBroker
 from .zygosity import ZygositySupport
 from .rest_api import RestAPI
 from .rec_list import RecListTask
-from .tab_report import reportCSV
+from .tab_report import iterReportCSV, iterReportJSON
 #===============================================
 class DataSet(SolutionBroker):
     sStatRqCount = 0
     sTimeCoeff = AnfisaConfig.configOption("tm.coeff")
     sMaxTabRqSize = AnfisaConfig.configOption("tab.max.count")
     sMaxExportSize = AnfisaConfig.configOption("export.max.count")
+    sStatPoolSize = AnfisaConfig.configOption("stat.pool.threads")
 
     #===============================================
     def __init__(self, data_vault, dataset_info, dataset_path,
@@ -79,6 +83,9 @@ class DataSet(SolutionBroker):
 
         self.mViewContext = dict()
         self.mPanelsExtra = dict()
+        self.mEvalCache = LRUCache(
+            AnfisaConfig.configOption("eval.cache.size"))
+        self.mEvalCacheLock = Lock()
 
         startTune(self)
         tuneAspects(self, self.mAspects)
@@ -282,6 +289,10 @@ class DataSet(SolutionBroker):
     def prepareAllUnitStat(self, condition, eval_h, stat_ctx,
             time_end, point_no = None):
         ret = []
+        stat_tasks = []
+        # only XL stats wait for Druid, WS stats are evaluated serially
+        parallel_mode = (self.sStatPoolSize > 1
+            and self.getDSKind() == "xl")
         for unit_h in self.getEvalSpace().iterUnits():
             if unit_h.isScreened():
                 continue
@@ -294,11 +305,41 @@ class DataSet(SolutionBroker):
                 ret.append(unit_h.prepareStat(
                     stat_ctx, incomplete_mode = True))
                 continue
+            if parallel_mode:
+                stat_tasks.append((len(ret), unit_h))
+                ret.append(None)
+                continue
             ret.append(unit_h.makeStat(condition, eval_h, stat_ctx))
             if time_end is not None and datetime.now() > time_end:
                 time_end = False
+        if len(stat_tasks) > 0:
+            self._runStatTasks(ret, stat_tasks,
+                condition, eval_h, stat_ctx, time_end)
         return ret
 
+    def _runStatTasks(self, ret, stat_tasks,
+            condition, eval_h, stat_ctx, time_end):
+        # pool per request: queries abandoned on deadline finish in
+        # threads of this request and do not delay other requests
+        stat_pool = ThreadPoolExecutor(
+            max_workers = min(self.sStatPoolSize, len(stat_tasks)),
+            thread_name_prefix = "unit-stat")
+        futures = [stat_pool.submit(unit_h.makeStat,
+            condition, eval_h, stat_ctx) for _, unit_h in stat_tasks]
+        timeout = None
+        if time_end is not None:
+            timeout = max(0., (time_end - datetime.now()).total_seconds())
+        done, not_done = wait(futures, timeout = timeout)
+        for future in not_done:
+            future.cancel()
+        stat_pool.shutdown(wait = False)
+        for future, (idx, unit_h) in zip(futures, stat_tasks):
+            if future in done:
+                ret[idx] = future.result()
+            else:
+                ret[idx] = unit_h.prepareStat(
+                    stat_ctx, incomplete_mode = True)
+
     def prepareSelectedUnitStat(self, unit_names, condition,
             eval_h, stat_ctx, time_end = None, point_no = None):
         ret = []
@@ -373,7 +414,10 @@ class DataSet(SolutionBroker):
             assert filter_h is None, "Filter&join collision"
             cond_data = cond_data[:] + join_cond_data[:]
         if filter_h is None:
-            filter_h = FilterEval(self.getEvalSpace(), cond_data)
+            return self._getAdHocEval("filter",
+                FilterEval.evalHashCode(cond_data),
+                lambda: FilterEval(self.getEvalSpace(), cond_data),
+                activate_it)
         filter_h = self.normalizeSolEntry("filter", filter_h)
         if activate_it:
             filter_h.activate()
@@ -389,6 +433,12 @@ class DataSet(SolutionBroker):
             else:
                 assert "code" in rq_args, (
                     'Missing request argument: "dtree" or "code"')
+                if not no_cache:
+                    return self._getAdHocEval("dtree",
+                        ParsedDTree.evalHashCode(rq_args["code"]),
+                        lambda: DTreeEval(
+                            self.getEvalSpace(), rq_args["code"]),
+                        activate_it)
                 dtree_h = DTreeEval(self.getEvalSpace(), rq_args["code"])
         if not no_cache:
             dtree_h = self.normalizeSolEntry("dtree", dtree_h)
@@ -396,6 +446,27 @@ class DataSet(SolutionBroker):
             dtree_h.activate()
         return dtree_h
 
+    def _getAdHocEval(self, kind, hash_code, create_f, activate_it):
+        # unsaved filters and trees are kept activated, so repeating
+        # requests of editing session do not parse and evaluate them again
+        with self.mEvalCacheLock:
+            eval_h = self.mEvalCache.get((kind, hash_code))
+        if eval_h is not None:
+            return eval_h
+        eval_h = self.normalizeSolEntry(kind, create_f())
+        if activate_it:
+            eval_h.activate()
+        if eval_h.getName() is None and eval_h.isActive():
+            with self.mEvalCacheLock:
+                self.mEvalCache[(kind, hash_code)] = eval_h
+        return eval_h
+
+    def refreshSolEntries(self, kind):
+        SolutionBroker.refreshSolEntries(self, kind)
+        # panels, tags and named solutions affect evaluation
+        with self.mEvalCacheLock:
+            self.mEvalCache.clear()
+
     def _getArgTimeEnd(self, rq_args):
         if self.getEvalSpace().heavyMode() and "tm" in rq_args:
             return datetime.now() + timedelta(
@@ -559,7 +630,9 @@ class DataSet(SolutionBroker):
             assert "code" in rq_args, 'Missing request argument "code"'
             parsed = ParsedDTree(self.getEvalSpace(), rq_args["code"])
             dtree_code = modifyDTreeCode(parsed, instr)
-            dtree_h = DTreeEval(self.getEvalSpace(), dtree_code)
+            dtree_h = self._getAdHocEval("dtree",
+                ParsedDTree.evalHashCode(dtree_code),
+                lambda: DTreeEval(self.getEvalSpace(), dtree_code), True)
         dtree_h = self._getArgDTree(rq_args, dtree_h = dtree_h)
         if rq_args.get("actsym") in ("1", "true", "yes"):
             self.collectActive(dtree_h)
@@ -669,8 +742,9 @@ class DataSet(SolutionBroker):
         assert "schema" in rq_args, 'Missing request argument "schema"'
         seq_rec_no = json.loads(rq_args["seq"])
         tab_schema = self.getStdItemData("tab-schema", rq_args["schema"])
-        return [tab_schema.reportRecord(self, rec_no)
-            for rec_no in seq_rec_no[:self.sMaxTabRqSize]]
+        seq_rec_no = seq_rec_no[:self.sMaxTabRqSize]
+        return ["!", "json", iterReportJSON(self, tab_schema, seq_rec_no),
+            []]
 
     #===============================================
     @RestAPI.ds_request
@@ -690,7 +764,7 @@ class DataSet(SolutionBroker):
             zone_data = rq_args.get("zone"))
         assert "schema" in rq_args, 'Missing request argument "schema"'
         tab_schema = self.getStdItemData("tab-schema", rq_args["schema"])
-        return ["!", "csv", reportCSV(self, tab_schema, rec_no_seq),
+        return ["!", "csv", iterReportCSV(self, tab_schema, rec_no_seq),
             [("Content-Disposition", "attachment;filename=anfisa_export.csv")]]
 
     #===============================================
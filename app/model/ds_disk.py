@@ -17,9 +17,11 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import sys, gzip, json
+import os, sys, gzip, json, shutil
 from io import TextIOWrapper
 from subprocess import Popen, PIPE
+from threading import Lock, Event
+from cachetools import LRUCache
 
 from forome_tools.ixbz2 import IndexBZ2, FormatterIndexBZ2
 from app.config.a_config import AnfisaConfig
@@ -29,14 +31,56 @@ class DataDiskStorage:
         self.mDS = ds_h
         self.mPath = dataset_path
         self.mVData = IndexBZ2(self.mPath + "/vdata.ixbz2")
+        self.mVDataCache = LRUCache(
+            AnfisaConfig.configOption("vdata.cache.mem"),
+            getsizeof = len)
+        self.mVDataLock = Lock()
+        self.mVDataLoading = dict()
+        if os.path.exists(self.mPath + "/pdata.ixbz2"):
+            self.mPData = IndexBZ2(self.mPath + "/pdata.ixbz2")
+        else:
+            self.mPData = None
 
     def getKind(self):
         return "disk"
 
-    def getRecordData(self, rec_no):
+    def _checkRecNo(self, rec_no):
         assert 0 <= rec_no < self.mDS.getTotal(), (
             f"Record no {rec_no} is out of bounds: {self.mDS.getTotal()}")
-        return json.loads(self.mVData[rec_no])
+
+    def _getRecordLine(self, rec_no):
+        # lock guards cache only, decompression runs outside of it;
+        # concurrent requests for the same record wait for one reader
+        with self.mVDataLock:
+            line = self.mVDataCache.get(rec_no)
+            if line is not None:
+                return line
+            loading = self.mVDataLoading.get(rec_no)
+            reader_mode = loading is None
+            if reader_mode:
+                loading = Event()
+                self.mVDataLoading[rec_no] = loading
+        if not reader_mode:
+            loading.wait()
+            with self.mVDataLock:
+                line = self.mVDataCache.get(rec_no)
+            if line is not None:
+                return line
+            return self.mVData[rec_no]
+        try:
+            line = self.mVData[rec_no]
+            if len(line) <= self.mVDataCache.maxsize:
+                with self.mVDataLock:
+                    self.mVDataCache[rec_no] = line
+        finally:
+            with self.mVDataLock:
+                del self.mVDataLoading[rec_no]
+            loading.set()
+        return line
+
+    def getRecordData(self, rec_no):
+        self._checkRecNo(rec_no)
+        return json.loads(self._getRecordLine(rec_no))
 
     def iterRecords(self, rec_no_seq):
         for rec_no in rec_no_seq:
@@ -84,38 +128,67 @@ class DataDiskStorage:
 
     def collectPReports(self, rec_no_seq, notifier = None):
         ret = dict()
-        for rec_no, it_data in self.iterPData(set(rec_no_seq), notifier):
-            ret[rec_no] = self.mDS.shortPDataReport(rec_no, it_data)
+        if self.mPData is None:
+            for rec_no, it_data in self.iterPData(set(rec_no_seq), notifier):
+                ret[rec_no] = self.mDS.shortPDataReport(rec_no, it_data)
+            return ret
+        rec_no_seq = sorted(set(rec_no_seq))
+        step_cnt = len(rec_no_seq) // 100 if notifier else 0
+        for idx, rec_no in enumerate(rec_no_seq):
+            if step_cnt > 0 and idx % step_cnt == 0:
+                notifier.onProgressChange(idx // step_cnt, "pdata")
+            self._checkRecNo(rec_no)
+            ret[rec_no] = self.mDS.shortPDataReport(rec_no,
+                json.loads(self.mPData[rec_no]))
         return ret
 
 #===============================================
 class DataDiskStorageWriter:
     def __init__(self, popen_mode, dataset_path, filter_set,
-            view_checker = None, report_mode = False):
+            view_checker = None, report_mode = False, chunk_mode = False):
         self.mPath = dataset_path
         self.mFilterSet = filter_set
         self.mViewChecker = view_checker
         self.mReportMode = report_mode
+        self.mChunkMode = chunk_mode
         self.mTotal = 0
 
-        if popen_mode:
-            self.mVDataProc = Popen(
-                sys.executable + " -m forome_tools.ixbz2 --calm -o "
-                + self.mPath + "/vdata.ixbz2 /dev/stdin", shell = True,
-                stdin = PIPE, stderr = PIPE,
-                bufsize = 1, universal_newlines = False,
-                close_fds = True)
+        self.mVDataProc, self.mVDataOut = self._openIndexedOut(
+            popen_mode, "vdata.ixbz2")
+        self.mPDataIdxProc, self.mPDataIdxOut = self._openIndexedOut(
+            popen_mode, "pdata.ixbz2")
 
-            self.mVDataOut = TextIOWrapper(self.mVDataProc.stdin,
-                encoding = "utf-8", line_buffering = True)
+        if chunk_mode:
+            # gzip members of prepared chunks are appended as they are
+            self.mFDataOut = open(self.mPath + "/fdata.json.gz", "wb")
+            self.mPDataOut = open(self.mPath + "/pdata.json.gz", "wb")
         else:
-            self.mVDataProc = None
-            self.mVDataOut = FormatterIndexBZ2(self.mPath + "/vdata.ixbz2")
-
-        self.mFDataOut = gzip.open(self.mPath + "/fdata.json.gz",
-                'wt', encoding = "utf-8")
-        self.mPDataOut = gzip.open(self.mPath + "/pdata.json.gz",
-                'wt', encoding = "utf-8")
+            self.mFDataOut = gzip.open(self.mPath + "/fdata.json.gz",
+                    'wt', encoding = "utf-8")
+            self.mPDataOut = gzip.open(self.mPath + "/pdata.json.gz",
+                    'wt', encoding = "utf-8")
+
+    def _openIndexedOut(self, popen_mode, fname):
+        if not popen_mode:
+            return None, FormatterIndexBZ2(self.mPath + "/" + fname)
+        proc = Popen(
+            sys.executable + " -m forome_tools.ixbz2 --calm -o "
+            + self.mPath + "/" + fname + " /dev/stdin", shell = True,
+            stdin = PIPE, stderr = PIPE,
+            bufsize = 1, universal_newlines = False,
+            close_fds = True)
+        return proc, TextIOWrapper(proc.stdin,
+            encoding = "utf-8", line_buffering = True)
+
+    def _closeIndexedOut(self, proc, outp):
+        if proc is None:
+            outp.close()
+            return
+        _, report_data = proc.communicate()
+        if self.mReportMode:
+            for line in str(report_data, encoding="utf-8").splitlines():
+                print(line, file = sys.stderr)
+        proc.wait()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
@@ -124,14 +197,8 @@ class DataDiskStorageWriter:
         return self
 
     def close(self):
-        if self.mVDataProc is not None:
-            _, vreport_data = self.mVDataProc.communicate()
-            if self.mReportMode:
-                for line in str(vreport_data, encoding="utf-8").splitlines():
-                    print(line, file = sys.stderr)
-            self.mVDataProc.wait()
-        else:
-            self.mVDataOut.close()
+        self._closeIndexedOut(self.mVDataProc, self.mVDataOut)
+        self._closeIndexedOut(self.mPDataIdxProc, self.mPDataIdxOut)
         self.mFDataOut.close()
         self.mPDataOut.close()
 
@@ -144,13 +211,43 @@ class DataDiskStorageWriter:
         flt_data = self.mFilterSet.process(rec_no, record, pre_data)
         if self.mViewChecker is not None:
             self.mViewChecker.regValue(rec_no, record)
-        if self.mVDataProc is not None:
-            print(json.dumps(record, ensure_ascii = False),
-                file = self.mVDataOut)
-        else:
-            self.mVDataOut.putLine(json.dumps(record, ensure_ascii = False))
-        print(json.dumps(flt_data, ensure_ascii = False),
-            file = self.mFDataOut)
-        print(json.dumps(pre_data, ensure_ascii = False),
-            file = self.mPDataOut)
+        self.saveLines(json.dumps(record, ensure_ascii = False),
+            json.dumps(flt_data, ensure_ascii = False),
+            json.dumps(pre_data, ensure_ascii = False))
+
+    def saveLines(self, rec_line, flt_line, pre_line):
+        # record already processed: lines are ready for output
+        assert not self.mChunkMode
+        self._putLine(self.mVDataProc, self.mVDataOut, rec_line)
+        print(flt_line, file = self.mFDataOut)
+        print(pre_line, file = self.mPDataOut)
+        self._putLine(self.mPDataIdxProc, self.mPDataIdxOut, pre_line)
         self.mTotal += 1
+
+    @staticmethod
+    def _putLine(proc, outp, line):
+        if proc is not None:
+            print(line, file = outp)
+        else:
+            outp.putLine(line)
+
+    @staticmethod
+    def _putLines(proc, outp, fpath):
+        with open(fpath, "r", encoding = "utf-8") as inp:
+            if proc is not None:
+                shutil.copyfileobj(inp, outp)
+                return
+            for line in inp:
+                outp.putLine(line.rstrip('\n'))
+
+    def saveChunk(self, vdata_path, fdata_gz_path, pdata_path,
+            pdata_gz_path, count):
+        # prepared chunk: no decoding and recompression of gzip data
+        assert self.mChunkMode
+        self._putLines(self.mVDataProc, self.mVDataOut, vdata_path)
+        self._putLines(self.mPDataIdxProc, self.mPDataIdxOut, pdata_path)
+        for fpath, outp in ((fdata_gz_path, self.mFDataOut),
+                (pdata_gz_path, self.mPDataOut)):
+            with open(fpath, "rb") as inp:
+                shutil.copyfileobj(inp, outp)
+        self.mTotal += count
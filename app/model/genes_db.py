@@ -18,11 +18,63 @@
 #  limitations under the License.
 #
 import logging, re, json
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from threading import Lock
 import bson.json_util as bjs
+from cachetools import LRUCache
+
+from app.config.a_config import AnfisaConfig
 
 def toJSON(bobj):
     return json.loads(bjs.dumps(bobj))
 
+#===============================================
+# Symbol index: sorted upper case names for prefix lookup and trigram
+# postings for wildcard patterns; the regular expression check is done
+# only over candidates selected by the index
+#===============================================
+class SymbolIndex:
+    sRegExpChars = set(".^$+?{}[]\\|()")
+
+    def __init__(self, symbols):
+        self.mKeys = sorted((symb.upper(), symb) for symb in symbols)
+        self.mUpperKeys = [key for key, _ in self.mKeys]
+        self.mTrigrams = defaultdict(set)
+        for idx, key in enumerate(self.mUpperKeys):
+            for pos in range(len(key) - 2):
+                self.mTrigrams[key[pos:pos + 3]].add(idx)
+
+    def _prefixRange(self, prefix):
+        idx_from = bisect_left(self.mUpperKeys, prefix)
+        idx_to = bisect_left(self.mUpperKeys, prefix + chr(0x10FFFF))
+        return set(range(idx_from, idx_to))
+
+    def selectCandidates(self, pattern):
+        # returns None if pattern can not be resolved by index
+        if any(ch in self.sRegExpChars for ch in pattern):
+            return None
+        fragments = pattern.upper().split('*')
+        if len(fragments) == 1:
+            return {self.mKeys[idx][1] for idx in range(
+                bisect_left(self.mUpperKeys, fragments[0]),
+                bisect_right(self.mUpperKeys, fragments[0]))}
+        idx_set = None
+        if fragments[0]:
+            idx_set = self._prefixRange(fragments[0])
+        for frag in fragments:
+            for pos in range(len(frag) - 2):
+                postings = self.mTrigrams.get(frag[pos:pos + 3], set())
+                if idx_set is None:
+                    idx_set = set(postings)
+                else:
+                    idx_set &= postings
+                if len(idx_set) == 0:
+                    return set()
+        if idx_set is None:
+            return None
+        return {self.mKeys[idx][1] for idx in idx_set}
+
 #===============================================
 class GenesDB:
     def __init__(self, mongo_conn):
@@ -38,6 +90,10 @@ class GenesDB:
             if "gtf" in rec:
                 self.mActiveSymbols.add(symb)
             self.mAllSymbols.add(symb)
+        self.mSymbolIndex = SymbolIndex(self.mAllSymbols)
+        self.mInfoCache = LRUCache(
+            AnfisaConfig.configOption("genes.info.cache.size"))
+        self.mInfoCacheLock = Lock()
         logging.info(f"GeneDb started with {len(self.mAllSymbols)} records, "
             + str(self.mMetaInfo))
 
@@ -54,8 +110,13 @@ class GenesDB:
                     "_id": symbol_name,
                     "gtf": [{"-": "no information provided"}]}
             return None
-        ret = self.mDB_h["symbols"].find_one({"_id": symbol_name})
-        return toJSON(ret)
+        with self.mInfoCacheLock:
+            ret = self.mInfoCache.get(symbol_name)
+        if ret is None:
+            ret = toJSON(self.mDB_h["symbols"].find_one({"_id": symbol_name}))
+            with self.mInfoCacheLock:
+                self.mInfoCache[symbol_name] = ret
+        return ret
 
     def selectSymbols(self, pattern, active_only = False,
             gene_list = None, extra = None):
@@ -63,13 +124,14 @@ class GenesDB:
             return None
         patt = re.compile(
             '^' + pattern.replace('*', '.*') + '$', re.IGNORECASE)
-        ret = set()
-        symbol_names = self.mActiveSymbols if active_only else self.mAllSymbols
+        symbol_names = self.mSymbolIndex.selectCandidates(pattern)
+        if symbol_names is None:
+            symbol_names = set(self.mAllSymbols)
+        if active_only:
+            symbol_names &= self.mActiveSymbols
         if extra is not None:
-            symbol_names = symbol_names | extra
+            symbol_names |= extra
         if gene_list:
             symbol_names &= set(gene_list)
-        for symbol_name in symbol_names:
-            if patt.match(symbol_name):
-                ret.add(symbol_name)
-        return sorted(ret)
+        return sorted(symbol_name for symbol_name in symbol_names
+            if patt.match(symbol_name))
@@ -18,9 +18,12 @@
 #  limitations under the License.
 #
 
+from app.config.a_config import AnfisaConfig
 from app.eval.var_unit import FunctionUnit
 #===============================================
 class RegionFuncUnit(FunctionUnit):
+    sMaxLoci = AnfisaConfig.configOption("region.max.loci")
+
     @staticmethod
     def makeIt(ds_h, descr, map_units, before = None, after = None):
         unit_h = RegionFuncUnit(ds_h, descr, map_units)
@@ -71,63 +74,108 @@ class RegionFuncUnit(FunctionUnit):
         return None
 
     def parse(self, locus):
+        # locus is a single "chrom:start-end:genes" entry or a list of
+        # entries (or BED lines) separated by new lines or semicolons
         if not locus:
             return None, "Empty locus"
+        lines = [line.strip()
+            for line in locus.replace(';', '\n').split('\n')]
+        lines = [line for line in lines if line and
+            not line.startswith(("#", "track", "browser"))]
+        if len(lines) == 0:
+            return None, "Empty locus"
+        if len(lines) > self.sMaxLoci:
+            return None, "Too many loci: %d" % len(lines)
+        loci, seq_cond = [], []
+        for line in lines:
+            loc_info, error_msg = self._parseLocus(line)
+            if loc_info is None:
+                if len(lines) > 1:
+                    error_msg += " in " + line
+                return None, error_msg
+            chrom, start, end, gene_values = loc_info
+            if gene_values is None:
+                loci.append((chrom, start, end))
+                continue
+            cond = self.getEvalSpace().makeEnumCond(
+                self.getEvalSpace().getUnit(self.mMapUnits["symbol"]),
+                gene_values)
+            if chrom is not None:
+                cond = self.getEvalSpace().makeRegionCond(
+                    self.mMapUnits, [(chrom, start, end)]).addAnd(cond)
+            seq_cond.append(cond)
+        if len(loci) > 0:
+            seq_cond.insert(0, self.getEvalSpace().makeRegionCond(
+                self.mMapUnits, list(dict.fromkeys(loci))))
+        return self.getEvalSpace().joinOr(seq_cond), None
+
+    @staticmethod
+    def _parseChrom(chrom_val):
+        chrom_val = chrom_val.upper()
+        if chrom_val.startswith("CHR"):
+            chrom_val = chrom_val[3:]
+        if (chrom_val.isdigit()):
+            if not (1 <= int(chrom_val) <= 23):
+                return None
+        elif chrom_val not in {"M", "X", "Y"}:
+            return None
+        return "chr" + chrom_val
+
+    @staticmethod
+    def _parsePos(pos_val):
+        pos_val = pos_val.strip()
+        if not pos_val.isdigit() or len(pos_val) > 10:
+            return None
+        return int(pos_val)
+
+    def _parseLocus(self, locus):
+        if ':' not in locus and len(locus.split()) >= 3:
+            # BED line: chrom, 0-based start, end
+            bed_fields = locus.split()
+            chrom = self._parseChrom(bed_fields[0])
+            if chrom is None:
+                return None, "Bad chromosome"
+            start_val = self._parsePos(bed_fields[1])
+            if start_val is None:
+                return None, "Bad start position"
+            end_val = self._parsePos(bed_fields[2])
+            if end_val is None:
+                return None, "Bad end position"
+            return (chrom, start_val + 1, end_val, None), None
+
         loc_parts = [part.strip() for part in locus.split(':')]
         if len(loc_parts) > 3:
             return None, "Bad locus: many fields"
         if len(loc_parts) < 2:
             return None, "Bad locus: too short"
 
-        seq_cond = []
-
+        chrom, start_val, end_val, gene_values = None, None, None, None
         if loc_parts[0]:
-            chrom_val = loc_parts[0].upper()
-            if chrom_val.startswith("CHR"):
-                chrom_val = chrom_val[3:]
-            if (chrom_val.isdigit()):
-                if not (1 <= int(chrom_val) <= 23):
-                    chrom_val = None
-            elif chrom_val not in {"M", "X", "Y"}:
-                chrom_val = None
-            if chrom_val is None:
+            chrom = self._parseChrom(loc_parts[0])
+            if chrom is None:
                 return None, "Bad chromosome"
-            seq_cond.append(self.getEvalSpace().makeEnumCond(
-                self.getEvalSpace().getUnit(self.mMapUnits["chrom"]),
-                ["chr" + chrom_val]))
 
         if loc_parts[1]:
-            if len(seq_cond) == 0:
+            if chrom is None:
                 return None, "No chromosome defined"
             start_val, sep, end_val = loc_parts[1].partition('-')
-            start_val = start_val.strip()
-            if not start_val.isdigit() or len(start_val) > 10:
+            start_val = self._parsePos(start_val)
+            if start_val is None:
                 return None, "Bad start position"
-            start_val = int(start_val)
-            seq_cond.append(self.getEvalSpace().makeNumericCond(
-                self.getEvalSpace().getUnit(self.mMapUnits["start"]),
-                min_val = start_val, min_eq = True))
             if not sep:
                 end_val = start_val
             else:
-                end_val = end_val.strip()
-                if not end_val.isdigit() or len(end_val) > 10:
+                end_val = self._parsePos(end_val)
+                if end_val is None:
                     return None, "Bad end position"
-                end_val = int(end_val.strip())
-            seq_cond.append(self.getEvalSpace().makeNumericCond(
-                self.getEvalSpace().getUnit(self.mMapUnits["end"]),
-                max_val = end_val, max_eq = True))
 
         if len(loc_parts) > 2:
             gene_values = [val.strip() for val in loc_parts[2].split(',')]
             if len(gene_values) < 1 or not all(gene_values) or max(
                     len(val) for val in gene_values) > 30:
                 return None, "Bad gene values"
-            seq_cond.append(self.getEvalSpace().makeEnumCond(
-                self.getEvalSpace().getUnit(self.mMapUnits["symbol"]),
-                gene_values))
 
-        if len(seq_cond) == 0:
+        if chrom is None and gene_values is None:
             return None, "Empty locus"
 
-        return self.getEvalSpace().joinAnd(seq_cond), None
+        return (chrom, start_val, end_val, gene_values), None
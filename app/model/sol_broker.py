@@ -51,7 +51,7 @@ class SolutionBroker(SyncronizedObject):
         self.mFamilyInfo = FamilyInfo(meta_info)
         self.addModes(self.mFamilyInfo.prepareModes())
 
-        if (1 <= len(self.mFamilyInfo) <= 10 and zygosity_support):
+        if len(self.mFamilyInfo) >= 1 and zygosity_support:
             self.addModes({"ZYG"})
         self.mZygSupport = None
 
@@ -19,7 +19,9 @@
 #
 
 from datetime import datetime
+from pymongo import UpdateOne
 
+from app.config.a_config import AnfisaConfig
 from .sol_support import makeSolItemInfo
 
 #===============================================
@@ -73,6 +75,15 @@ class SolutionEnv:
             return True
         return False
 
+    def updateEntries(self, ds_name, sol_kind, name_value_seq,
+            rubric = None, notify_func = None):
+        if self.mHandlers[sol_kind].updateEntries(
+                name_value_seq, rubric, ds_name, notify_func):
+            for broker_h in self.mBrokers:
+                broker_h.refreshSolEntries(sol_kind)
+            return True
+        return False
+
     def dumpAll(self):
         ret = []
         for rec_obj in self.mMongoAgent.find():
@@ -130,3 +141,28 @@ class _SolKindMongoHandler:
             self.mIntVersion += 1
             return True
         return False
+
+    def updateEntries(self, name_value_seq, rubric, upd_from,
+            notify_func = None):
+        if len(name_value_seq) == 0:
+            return False
+        portion_size = AnfisaConfig.configOption("mongo.bulk.portion")
+        upd_time = datetime.now().isoformat()
+        for idx in range(0, len(name_value_seq), portion_size):
+            operations, infos = [], []
+            for name, value in name_value_seq[idx:idx + portion_size]:
+                info = makeSolItemInfo(self.mSolKind,
+                    name, value, rubric,
+                    upd_time = upd_time,
+                    upd_from = upd_from)
+                operations.append(UpdateOne(
+                    {"_tp": self.mSolKind, "name": name},
+                    {"$set": info}, upsert = True))
+                infos.append(info)
+            self.mMongoAgent.bulk_write(operations, ordered = False)
+            for info in infos:
+                self.mEntries[info["name"]] = info
+            if notify_func is not None:
+                notify_func(idx + len(operations))
+        self.mIntVersion += 1
+        return True
@@ -17,7 +17,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-import csv
+import csv, json
 from io import StringIO
 
 from forome_tools.path_works import AttrFuncHelper
@@ -60,8 +60,9 @@ class ReportTabSchema:
             ret.append("_tags")
         return ret
 
-    def reportRecord(self, ds_h, rec_no):
-        rec_data = ds_h.getRecordData(rec_no)
+    def reportRecord(self, ds_h, rec_no, rec_data = None):
+        if rec_data is None:
+            rec_data = ds_h.getRecordData(rec_no)
         ret_handle = {"_no": rec_no}
         if self.mUseTags:
             if ds_h.getDSKind() == "ws":
@@ -77,13 +78,13 @@ class ReportTabSchema:
         return ret_handle
 
 #===============================================
-def reportCSV(ds_h, tab_schema, rec_no_seq):
+def iterReportCSV(ds_h, tab_schema, rec_no_seq, chunk_size = 0x10000):
     output = StringIO()
     writer = csv.writer(output)
     fld_names = tab_schema.getFieldNames()
     writer.writerow(fld_names)
-    for rec_no in rec_no_seq:
-        rec_descr = tab_schema.reportRecord(ds_h, rec_no)
+    for rec_no, rec_data in ds_h.getRecStorage().iterRecords(rec_no_seq):
+        rec_descr = tab_schema.reportRecord(ds_h, rec_no, rec_data)
         row = []
         for fld in fld_names:
             val = rec_descr[fld]
@@ -94,4 +95,24 @@ def reportCSV(ds_h, tab_schema, rec_no_seq):
             else:
                 row.append(str(val))
         writer.writerow(row)
-    return output.getvalue()
+        if output.tell() >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+def iterReportJSON(ds_h, tab_schema, rec_no_seq, chunk_size = 0x10000):
+    output = StringIO()
+    output.write('[')
+    for idx, (rec_no, rec_data) in enumerate(
+            ds_h.getRecStorage().iterRecords(rec_no_seq)):
+        if idx > 0:
+            output.write(", ")
+        output.write(json.dumps(
+            tab_schema.reportRecord(ds_h, rec_no, rec_data)))
+        if output.tell() >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    output.write(']')
+    yield output.getvalue()
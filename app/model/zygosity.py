@@ -17,7 +17,10 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-import logging
+import logging, json
+from hashlib import md5
+from threading import Lock
+from cachetools import LRUCache
 
 from app.config.a_config import AnfisaConfig
 from app.eval.condition import ZYG_BOUNDS_VAL
@@ -33,6 +36,11 @@ class ZygositySupport:
         self.mXCondition = None
         self.mApproxInfo = []
         self.mGeneUnits = dict()
+        self.mCompoundCache = LRUCache(
+            AnfisaConfig.configOption("comp-hets.cache.mem"),
+            getsizeof = lambda entry: entry[1])
+        self.mCompoundLock = Lock()
+        self.mCompoundCounts = {"hits": 0, "misses": 0}
 
     def setupX(self, x_unit, x_values):
         self.mXCondition = self.mEvalSpace.makeEnumCond(
@@ -79,12 +87,9 @@ class ZygositySupport:
     # Scenarios
     # =========================
     def conditionScenario(self, scenario):
-        seq = []
-        for zyg_bounds, seq_samples in scenario.items():
-            for idx in self.mFamilyInfo.names2idxset(seq_samples):
-                seq.append(self.mEvalSpace.makeNumericCond(
-                    self.mEvalSpace.getZygUnit(idx), zyg_bounds=zyg_bounds))
-        return self.mEvalSpace.joinAnd(seq)
+        return self.mEvalSpace.makeZygScenarioCond([
+            (zyg_bounds, sorted(self.mFamilyInfo.names2idxset(seq_samples)))
+            for zyg_bounds, seq_samples in scenario.items()])
 
     def conditionZHomoRecess(self, problem_group):
         cond = self._conditionZHomoRecess(problem_group)
@@ -118,6 +123,8 @@ class ZygositySupport:
     # =========================
     def makeCompoundRequest(self, approx_mode,
                             actual_condition, c_rq, unit_name):
+        gene_unit_h = self.mGeneUnits[approx_mode]
+        gene_index = self.mEvalSpace.getGeneIndex(gene_unit_h)
         set_genes = None
         cond_scenario_seq = []
         for min_count, scenario in c_rq:
@@ -127,13 +134,11 @@ class ZygositySupport:
             if min_count < 1:
                 continue
             cond_scenario_seq.append(cond_scenario)
-            stat_info = self.mGeneUnits[approx_mode].makeStat(
-                actual_condition.addAnd(cond_scenario), None, dict())
-            genes = set()
-            for info in stat_info["variants"]:
-                gene, count = info[:2]
-                if count >= min_count:
-                    genes.add(gene)
+            condition = actual_condition.addAnd(cond_scenario)
+            if gene_index is not None:
+                genes = gene_index.evalGeneSet(condition, min_count)
+            else:
+                genes = self._evalGeneSet(gene_unit_h, condition, min_count)
             if set_genes is not None:
                 set_genes &= genes
             else:
@@ -142,17 +147,58 @@ class ZygositySupport:
                 return self.mEvalSpace.getCondNone()
         if set_genes is None:
             return self.mEvalSpace.getCondNone()
-        if len(set_genes) >= self.sMaxGeneCompCount:
-            return None
+        if gene_index is not None:
+            gene_condition = gene_index.makeGeneSetCond(set_genes)
+        else:
+            if len(set_genes) >= self.sMaxGeneCompCount:
+                return None
+            gene_condition = gene_unit_h.buildCondition(
+                [None, None, "OR", sorted(set_genes)], None)
         logging.info(
             f"Eval compound genes for {unit_name}/{approx_mode}:"
             + str(len(set_genes)))
 
         return self.mEvalSpace.joinAnd([
-            actual_condition, self.mGeneUnits[approx_mode].buildCondition(
-                [None, None, "OR", sorted(set_genes)], None),
+            actual_condition, gene_condition,
             self.mEvalSpace.joinOr(cond_scenario_seq)])
 
+    @staticmethod
+    def _evalGeneSet(gene_unit_h, condition, min_count):
+        stat_info = gene_unit_h.makeStat(condition, None, dict())
+        genes = set()
+        for info in stat_info["variants"]:
+            gene, count = info[:2]
+            if count >= min_count:
+                genes.add(gene)
+        return genes
+
+    def getCompoundContext(self, rq_kind, rq_data,
+            actual_condition, build_f):
+        # build_f() returns context and sequence of its conditions
+        build_id = md5(bytes(json.dumps([rq_kind, rq_data], sort_keys = True)
+            + '|' + self.mEvalSpace.condContentKey(actual_condition),
+            encoding = "utf-8")).hexdigest()
+        with self.mCompoundLock:
+            entry = self.mCompoundCache.get(build_id)
+            if entry is not None:
+                self.mCompoundCounts["hits"] += 1
+                return entry[0]
+            self.mCompoundCounts["misses"] += 1
+        context, cond_seq = build_f()
+        mem_size = 1 + sum(self.mEvalSpace.condMemSize(cond)
+            for cond in cond_seq if cond is not None)
+        if mem_size <= self.mCompoundCache.maxsize:
+            with self.mCompoundLock:
+                self.mCompoundCache[build_id] = (context, mem_size)
+        return context
+
+    def reportCompoundCacheStat(self):
+        with self.mCompoundLock:
+            ret = dict(self.mCompoundCounts)
+            ret["size"] = len(self.mCompoundCache)
+            ret["mem"] = self.mCompoundCache.currsize
+        return ret
+
     @classmethod
     def emptyRequest(cls, request):
         for rq_var in request:
@@ -17,7 +17,9 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-import sys, os, logging, json, gzip
+import sys, os, logging, json, gzip, bz2, shutil, multiprocessing
+from collections import deque
+from itertools import islice
 from datetime import datetime
 from io import StringIO
 
@@ -34,7 +36,8 @@ from .v_check import ViewDataChecker
 #=====================================
 def createDS(ds_dir, mongo_conn, druid_adm, ds_name, ds_source, ds_kind,
         ds_inv = None, report_lines = False,
-        favor_storage = None, no_druid_push = False):
+        favor_storage = None, no_druid_push = False,
+        workers = 0, resume = False):
     assert solutionsAreReady()
     assert (ds_kind == "xl") == (druid_adm is not None)
 
@@ -73,8 +76,8 @@ def createDS(ds_dir, mongo_conn, druid_adm, ds_name, ds_source, ds_kind,
         metadata_record["versions"][
             "Anfisa load"] = AnfisaConfig.getAnfisaVersion()
 
-    filter_set = defineFilterSchema(metadata_record, ds_kind,
-        druid_adm if ds_kind != "ws" else None)
+    flt_druid_adm = druid_adm if ds_kind != "ws" else None
+    filter_set = defineFilterSchema(metadata_record, ds_kind, flt_druid_adm)
     view_aspects = defineViewSchema(metadata_record, filter_set.getModes())
     view_checker = ViewDataChecker(view_aspects)
 
@@ -82,13 +85,31 @@ def createDS(ds_dir, mongo_conn, druid_adm, ds_name, ds_source, ds_kind,
         if report_lines:
             print("Processing...", file = sys.stderr)
 
+        chunk_dir = None
+        if workers > 0 and not os.path.isfile(ds_source):
+            assert not resume, "Resume requires single source file"
+            logging.warning("Parallel mode requires single source file, "
+                "records are processed in one process")
+            workers = 0
+        if workers > 0:
+            chunk_dir = _prepareChunks(ds_dir, ds_source,
+                (metadata_record, ds_kind, flt_druid_adm, view_aspects),
+                workers, resume, report_lines)
         with DataDiskStorageWriter(True, ds_dir, filter_set,
-                view_checker, report_lines) as ds_out:
-            for record in input_reader:
-                ds_out.saveRecord(record)
-                if report_lines and ds_out.getTotal() % report_lines == 0:
-                    sys.stderr.write("\r%d lines..." % ds_out.getTotal())
+                view_checker, report_lines,
+                chunk_mode = chunk_dir is not None) as ds_out:
+            if chunk_dir is not None:
+                _assembleChunks(chunk_dir, ds_out,
+                    filter_set, view_checker, report_lines)
+            else:
+                for record in input_reader:
+                    ds_out.saveRecord(record)
+                    if (report_lines
+                            and ds_out.getTotal() % report_lines == 0):
+                        sys.stderr.write("\r%d lines..." % ds_out.getTotal())
             total = ds_out.getTotal()
+        if chunk_dir is not None:
+            shutil.rmtree(chunk_dir)
         input_reader.close()
         if report_lines:
             print("\nTotal lines: %d" % total, file = sys.stderr)
@@ -163,6 +184,143 @@ def createDS(ds_dir, mongo_conn, druid_adm, ds_name, ds_source, ds_kind,
         % (ds_name, ok_status, str(time_done), str(time_done - time_start)))
 
 #=====================================
+# Parallel preparation: raw input lines are split into chunks, chunks are
+# parsed and prepared in worker processes into files of <ds_dir>/chunks~/,
+# then the main process merges statistics and joins the chunk data
+# without decoding it. State file of chunk is stored last, so completed
+# chunks survive interruption and are skipped on resume
+#=====================================
+sChunkEnv = None
+
+def _initChunkWorker(chunk_dir, create_env):
+    global sChunkEnv
+    sChunkEnv = (chunk_dir, create_env)
+
+def _chunkPath(chunk_dir, chunk_no, ext):
+    return chunk_dir + "/%05d.%s" % (chunk_no, ext)
+
+# plain lines for indexed bz2 outputs, gzip members for the others
+sChunkDataKinds = ("vdata", "fdata.gz", "pdata", "pdata.gz")
+
+def _openChunkFile(chunk_dir, chunk_no, kind):
+    fpath = _chunkPath(chunk_dir, chunk_no, kind)
+    if kind.endswith(".gz"):
+        return gzip.open(fpath, "wt", encoding = "utf-8")
+    return open(fpath, "w", encoding = "utf-8")
+
+def _prepareChunk(chunk_no, rec_no_start, lines):
+    chunk_dir, create_env = sChunkEnv
+    metadata_record, ds_kind, druid_adm, view_aspects = create_env
+    filter_set = defineFilterSchema(metadata_record, ds_kind, druid_adm)
+    view_checker = ViewDataChecker(view_aspects)
+    outputs = [_openChunkFile(chunk_dir, chunk_no, kind)
+        for kind in sChunkDataKinds]
+    for idx, line in enumerate(lines):
+        rec_no = rec_no_start + idx
+        record = json.loads(line)
+        pre_data = AnfisaConfig.getVariantSystemFields(record)
+        flt_data = filter_set.process(rec_no, record, pre_data)
+        view_checker.regValue(rec_no, record)
+        pre_line = json.dumps(pre_data, ensure_ascii = False)
+        for outp, out_line in zip(outputs, (
+                json.dumps(record, ensure_ascii = False),
+                json.dumps(flt_data, ensure_ascii = False),
+                pre_line, pre_line)):
+            print(out_line, file = outp)
+    for outp in outputs:
+        outp.close()
+    state_path = _chunkPath(chunk_dir, chunk_no, "state.json")
+    with open(state_path + "~", "w", encoding = "utf-8") as outp:
+        outp.write(json.dumps({
+            "count": len(lines),
+            "filters": filter_set.getPrepState(),
+            "view": view_checker.getPrepState()}, ensure_ascii = False))
+    os.rename(state_path + "~", state_path)
+    return chunk_no
+
+def _openSource(ds_source):
+    if ds_source.endswith(".gz"):
+        return gzip.open(ds_source, "rt", encoding = "utf-8")
+    if ds_source.endswith(".bz2"):
+        return bz2.open(ds_source, "rt", encoding = "utf-8")
+    return open(ds_source, "r", encoding = "utf-8")
+
+def _readChunks(ds_source, chunk_size, chunks_ready):
+    # raw lines are not decoded here, metadata line is skipped
+    with _openSource(ds_source) as inp:
+        line_iter = (line for line in inp if line.strip())
+        next(line_iter, None)
+        chunk_no = 0
+        while True:
+            if chunk_no in chunks_ready:
+                if sum(1 for _ in islice(line_iter, chunk_size)) == 0:
+                    return
+            else:
+                lines = list(islice(line_iter, chunk_size))
+                if len(lines) == 0:
+                    return
+                yield chunk_no, lines
+            chunk_no += 1
+
+def _prepareChunks(ds_dir, ds_source, create_env,
+        workers, resume, report_lines):
+    chunk_size = AnfisaConfig.configOption("create.chunk.size")
+    chunk_dir = ds_dir + "/chunks~"
+    setup = {"source": ds_source, "chunk-size": chunk_size,
+        "kinds": list(sChunkDataKinds)}
+    if os.path.exists(chunk_dir):
+        prev_setup = None
+        if resume and os.path.exists(chunk_dir + "/setup.json"):
+            with open(chunk_dir + "/setup.json",
+                    "r", encoding = "utf-8") as inp:
+                prev_setup = json.loads(inp.read())
+        if prev_setup != setup:
+            shutil.rmtree(chunk_dir)
+    if not os.path.exists(chunk_dir):
+        os.mkdir(chunk_dir)
+        with open(chunk_dir + "/setup.json", "w", encoding = "utf-8") as outp:
+            outp.write(json.dumps(setup))
+    chunks_ready = {int(fname.split('.')[0])
+        for fname in os.listdir(chunk_dir) if fname.endswith(".state.json")}
+    if report_lines and len(chunks_ready) > 0:
+        print("Chunks ready: %d" % len(chunks_ready), file = sys.stderr)
+
+    # input is read in main process, so the amount of chunks in work
+    # is limited to keep memory usage under control
+    max_pending = 2 * workers
+    cnt_done = 0
+    with multiprocessing.get_context("fork").Pool(workers,
+            _initChunkWorker, (chunk_dir, create_env)) as pool:
+        pending = deque()
+        for chunk_no, lines in _readChunks(
+                ds_source, chunk_size, chunks_ready):
+            pending.append(pool.apply_async(_prepareChunk,
+                (chunk_no, chunk_no * chunk_size, lines)))
+            while len(pending) >= max_pending or (
+                    len(pending) > 0 and pending[0].ready()):
+                pending.popleft().get()
+                cnt_done += 1
+                if report_lines:
+                    sys.stderr.write("\r%d chunks..." % cnt_done)
+        while len(pending) > 0:
+            pending.popleft().get()
+    return chunk_dir
+
+def _assembleChunks(chunk_dir, ds_out, filter_set, view_checker,
+        report_lines):
+    chunk_no = 0
+    while os.path.exists(_chunkPath(chunk_dir, chunk_no, "state.json")):
+        with open(_chunkPath(chunk_dir, chunk_no, "state.json"),
+                "r", encoding = "utf-8") as inp:
+            chunk_state = json.loads(inp.read())
+        filter_set.mergePrepState(chunk_state["filters"])
+        view_checker.mergePrepState(chunk_state["view"])
+        ds_out.saveChunk(*[_chunkPath(chunk_dir, chunk_no, kind)
+            for kind in sChunkDataKinds], count = chunk_state["count"])
+        if report_lines:
+            sys.stderr.write("\r%d lines..." % ds_out.getTotal())
+        chunk_no += 1
+
 def pushDruidDataset(ds_dir, druid_adm, ds_name):
     assert solutionsAreReady()
     with open(ds_dir + "/dsinfo.json",
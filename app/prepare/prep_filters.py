@@ -304,6 +304,17 @@ class FilterPrepareSetH(SolutionBroker):
                     f"{unit.getErrorCount()} bad conversions", file = output)
         return True
 
+    def getPrepState(self):
+        return [unit.getPrepState() for unit in self.mUnits]
+
+    def mergePrepState(self, state):
+        assert len(state) == len(self.mUnits), "Filter state conflict"
+        for unit, unit_state in zip(self.mUnits, state):
+            unit.mergePrepState(unit_state)
+
+    def merge(self, other):
+        self.mergePrepState(other.getPrepState())
+
     def dump(self):
         return [unit.dump() for unit in self.mUnits]
 
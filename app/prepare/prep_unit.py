@@ -49,6 +49,21 @@ class ValueConvertor:
         if len(self.mErrors) < self.sMAX_BAD_COUNT:
             self.mErrors.append([rec_no, values])
 
+    def getPrepState(self):
+        return {"err": [self.mErrorCount, self.mErrors]}
+
+    def mergePrepState(self, state):
+        err_count, errors = state["err"]
+        self.mErrorCount += err_count
+        self.mErrors += errors[:self.sMAX_BAD_COUNT - len(self.mErrors)]
+
+    def merge(self, other):
+        # other: the same unit collected on the next portion of records
+        assert (other.__class__ is self.__class__
+            and other.getName() == self.mName), (
+            "Unit merge conflict: " + self.mName)
+        self.mergePrepState(other.getPrepState())
+
     def getTranscriptName(self):
         return None
 
@@ -161,6 +176,20 @@ class _NumericStatCollector:
             self.mCntUndef += 1
         return self.mDefaultValue
 
+    def getStatState(self):
+        return [self.mCntDef, self.mCntUndef, self.mMinValue, self.mMaxValue]
+
+    def mergeStatState(self, stat_state):
+        cnt_def, cnt_undef, min_value, max_value = stat_state
+        self.mCntDef += cnt_def
+        self.mCntUndef += cnt_undef
+        if min_value is not None and (self.mMinValue is None
+                or min_value < self.mMinValue):
+            self.mMinValue = min_value
+        if max_value is not None and (self.mMaxValue is None
+                or max_value > self.mMaxValue):
+            self.mMaxValue = max_value
+
     def statResult(self):
         ret = {
             "kind": "numeric",
@@ -189,6 +218,15 @@ class _NumericConvertor(PathValueConvertor, _NumericStatCollector):
     def checkSetup(self):
         self.checkDiap()
 
+    def getPrepState(self):
+        ret = PathValueConvertor.getPrepState(self)
+        ret["stat"] = self.getStatState()
+        return ret
+
+    def mergePrepState(self, state):
+        PathValueConvertor.mergePrepState(self, state)
+        self.mergeStatState(state["stat"])
+
     def convert(self, values, rec_no):
         try:
             if self.mConvFunc is not None and len(values) == 1:
@@ -294,6 +332,14 @@ class _EnumStatCollector:
             self.mVarCount[self.mDefaultValue] += 1
         return self.mDefaultValue
 
+    def getStatState(self):
+        return [dict(self.mVarCount), self.mCntUndef]
+
+    def mergeStatState(self, stat_state):
+        var_count, cnt_undef = stat_state
+        self.mVarCount.update(var_count)
+        self.mCntUndef += cnt_undef
+
     def statResult(self):
         ret = {
             "kind": "enum",
@@ -337,6 +383,15 @@ class EnumConvertor(PathValueConvertor, _EnumStatCollector):
         if self.mSubKind != "status" and self.mDefaultRet is not None:
             self.mDefaultRet = [self.mDefaultRet]
 
+    def getPrepState(self):
+        ret = PathValueConvertor.getPrepState(self)
+        ret["stat"] = self.getStatState()
+        return ret
+
+    def mergePrepState(self, state):
+        PathValueConvertor.mergePrepState(self, state)
+        self.mergeStatState(state["stat"])
+
     def convert(self, values, rec_no):
         ret = []
         try:
@@ -443,6 +498,15 @@ class PresenceConvertor(ValueConvertor):
         if res_val is not None:
             result[self.getName()] = res_val
 
+    def getPrepState(self):
+        ret = ValueConvertor.getPrepState(self)
+        ret["var-count"] = dict(self.mVarCount)
+        return ret
+
+    def mergePrepState(self, state):
+        ValueConvertor.mergePrepState(self, state)
+        self.mVarCount.update(state["var-count"])
+
     def dump(self):
         ret = ValueConvertor.dump(self)
         ret["kind"] = "enum"
@@ -493,6 +557,17 @@ class PanelConvertor(ValueConvertor):
                     data[self.mViewPathSeq[-1]] = res_val
         result[self.getName()] = res_val
 
+    def getPrepState(self):
+        ret = ValueConvertor.getPrepState(self)
+        ret["var-count"] = dict(self.mVarCount)
+        ret["undef"] = self.mCntUndef
+        return ret
+
+    def mergePrepState(self, state):
+        ValueConvertor.mergePrepState(self, state)
+        self.mVarCount.update(state["var-count"])
+        self.mCntUndef += state["undef"]
+
     def dump(self):
         ret = ValueConvertor.dump(self)
         ret["kind"] = "enum"
@@ -553,6 +628,17 @@ class TranscriptNumConvertor(ValueConvertor, _NumericStatCollector):
     def processEmpty(self):
         pass
 
+    def getPrepState(self):
+        ret = ValueConvertor.getPrepState(self)
+        ret["stat"] = self.getStatState()
+        ret["ok"] = self.mIsOK
+        return ret
+
+    def mergePrepState(self, state):
+        ValueConvertor.mergePrepState(self, state)
+        self.mergeStatState(state["stat"])
+        self.mIsOK &= state["ok"]
+
     def dump(self):
         ret = ValueConvertor.dump(self)
         ret.update(self.statResult())
@@ -586,6 +672,15 @@ class _TranscriptEnumConvertor(ValueConvertor, _EnumStatCollector):
     def process(self, rec_no, rec_data, result):
         assert False
 
+    def getPrepState(self):
+        ret = ValueConvertor.getPrepState(self)
+        ret["stat"] = self.getStatState()
+        return ret
+
+    def mergePrepState(self, state):
+        ValueConvertor.mergePrepState(self, state)
+        self.mergeStatState(state["stat"])
+
     def dump(self):
         ret = ValueConvertor.dump(self)
         ret.update(self.statResult())
@@ -624,6 +719,15 @@ class TranscriptStatusConvertor(_TranscriptEnumConvertor):
             self.mIsOK = False
         return self.regErrVal()
 
+    def getPrepState(self):
+        ret = _TranscriptEnumConvertor.getPrepState(self)
+        ret["ok"] = self.mIsOK
+        return ret
+
+    def mergePrepState(self, state):
+        _TranscriptEnumConvertor.mergePrepState(self, state)
+        self.mIsOK &= state["ok"]
+
     def processOne(self, value):
         if not isinstance(value, list):
             value = str(value)
@@ -671,6 +775,15 @@ class TranscriptMultiConvertor(_TranscriptEnumConvertor):
                 f"For numeric tr-unit {self.getName} bad value: {value}")
             self.mIsOK = False
 
+    def getPrepState(self):
+        ret = _TranscriptEnumConvertor.getPrepState(self)
+        ret["ok"] = self.mIsOK
+        return ret
+
+    def mergePrepState(self, state):
+        _TranscriptEnumConvertor.mergePrepState(self, state)
+        self.mIsOK &= state["ok"]
+
     def processOne(self, value):
         values = set()
         if value:
@@ -24,6 +24,64 @@ import json
 from forome_tools.types import Types, TypeCounter
 from app.view.attr import AttrH
 
+#===============================================
+def _valueKind(value):
+    # kind of value as TypeCounter sees it (empty and link strings,
+    # empty containers apart) and a small sample value of the kind
+    if isinstance(value, str):
+        if not value:
+            return "str-empty", value
+        if value.startswith("http:") or value.startswith("https:"):
+            return "str-link", value
+        return "str", value
+    if isinstance(value, list):
+        return ("list", [None]) if value else ("list-empty", [])
+    if isinstance(value, dict):
+        return ("dict", {"": None}) if value else ("dict-empty", {})
+    return type(value).__name__, value
+
+#===============================================
+class _TypeTally:
+    # TypeCounter with explicit counts of registered value kinds:
+    # counts are mergeable, the counter is restored from them by replay
+    def __init__(self, expect_type = None):
+        self.mExpectType = expect_type
+        self.mCounter = TypeCounter(expect_type)
+        self.mKinds = dict()
+        self.mReplayNeeded = False
+
+    def _replay(self):
+        if self.mReplayNeeded:
+            self.mCounter = TypeCounter(self.mExpectType)
+            for count, sample in self.mKinds.values():
+                for _ in range(count):
+                    self.mCounter.regValue(sample)
+            self.mReplayNeeded = False
+
+    def regValue(self, value):
+        self._replay()
+        kind, sample = _valueKind(value)
+        if kind in self.mKinds:
+            self.mKinds[kind][0] += 1
+        else:
+            self.mKinds[kind] = [1, sample]
+        return self.mCounter.regValue(value)
+
+    def getState(self):
+        return {kind: info[:] for kind, info in self.mKinds.items()}
+
+    def mergeState(self, state):
+        for kind, (count, sample) in state.items():
+            if kind in self.mKinds:
+                self.mKinds[kind][0] += count
+            else:
+                self.mKinds[kind] = [count, sample]
+        self.mReplayNeeded = True
+
+    def detect(self, no_mode = False):
+        self._replay()
+        return self.mCounter.detect(no_mode = no_mode)
+
 #===============================================
 class AttrTypeChecker:
     sMAX_BAD_COUNT = 3
@@ -39,11 +97,11 @@ class AttrTypeChecker:
             expect_type = Types.filterTypeKind(base_attr.getKinds())
 
         if base_attr and base_attr.isSeq():
-            self.mMainTpCnt = TypeCounter("list")
-            self.mSubTpCnt = TypeCounter(expect_type)
+            self.mMainTpCnt = _TypeTally("list")
+            self.mSubTpCnt = _TypeTally(expect_type)
         else:
-            self.mMainTpCnt = TypeCounter(expect_type)
-            self.mSubTpCnt = TypeCounter()
+            self.mMainTpCnt = _TypeTally(expect_type)
+            self.mSubTpCnt = _TypeTally()
 
     def setStatus(self, status):
         self.mStatus = status
@@ -75,6 +133,25 @@ class AttrTypeChecker:
                 self.mErrors.append([rec_no, value])
         return is_ok
 
+    def getPrepState(self):
+        return {
+            "main": self.mMainTpCnt.getState(),
+            "sub": self.mSubTpCnt.getState(),
+            "err": [self.mErrCount, self.mErrors]}
+
+    def mergePrepState(self, state):
+        assert self.mDetType is False
+        self.mMainTpCnt.mergeState(state["main"])
+        self.mSubTpCnt.mergeState(state["sub"])
+        err_count, errors = state["err"]
+        self.mErrCount += err_count
+        self.mErrors += errors[:self.sMAX_BAD_COUNT - len(self.mErrors)]
+
+    def merge(self, other):
+        assert other.getName() == self.mName, (
+            "Checker merge conflict: " + self.mName)
+        self.mergePrepState(other.getPrepState())
+
     def fixType(self, no_mode = False):
         assert self.mDetType is False
         tp = self.mMainTpCnt.detect(no_mode = no_mode)
@@ -148,6 +225,47 @@ class DictTypeChecker:
             self.regIt(reg_h)
         reg_h.regValue(rec_no, val)
 
+    @staticmethod
+    def _isItemChecker(reg_h):
+        # checkers created in regItemValue() for unknown names
+        return (isinstance(reg_h, AttrTypeChecker)
+            and reg_h.getBaseAttr() is None)
+
+    def getPrepState(self):
+        return {
+            "own": self.mOwnCnt.getPrepState(),
+            "status": self.mStatus,
+            "children": [[a_check.getName(), self._isItemChecker(a_check),
+                a_check.getPrepState()] for a_check in self.mChildren]}
+
+    def mergePrepState(self, state):
+        self.mOwnCnt.mergePrepState(state["own"])
+        if state["status"] is not None:
+            self.mStatus = state["status"]
+        own_children = [a_check for a_check in self.mChildren
+            if not self._isItemChecker(a_check)]
+        idx = 0
+        for name, is_item, a_state in state["children"]:
+            if is_item:
+                reg_h = self.mReg.get(name)
+                if reg_h is None:
+                    reg_h = AttrTypeChecker(name)
+                    self.regIt(reg_h)
+            else:
+                reg_h = own_children[idx]
+                idx += 1
+                assert reg_h.getName() == name, (
+                    "Checker state conflict: " + name)
+            reg_h.mergePrepState(a_state)
+        assert idx == len(own_children), (
+            "Checker state conflict: " + self.mName)
+
+    def merge(self, other):
+        assert (other.__class__ is self.__class__
+            and other.getName() == self.mName), (
+            "Checker merge conflict: " + self.mName)
+        self.mergePrepState(other.getPrepState())
+
     def fixUp(self, master, rep_output, no_mode = False):
         self.mOwnCnt.fixType(no_mode = no_mode)
         if self.mOwnCnt.getErrorCount() > 0:
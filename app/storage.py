@@ -57,7 +57,7 @@ def checkDSName(name, kind):
 
 #===============================================
 def createDataSet(app_config, ds_entry, force_drop, druid_adm,
-        report_lines, no_druid_push = False):
+        report_lines, no_druid_push = False, workers = 0, resume = False):
     setupSolutions(app_config)
 
     if not ds_entry.getSource():
@@ -74,17 +74,29 @@ def createDataSet(app_config, ds_entry, force_drop, druid_adm,
 
     checkDSName(ds_entry.getName(), ds_entry.getDSKind())
     ds_dir = os.path.abspath(vault_dir + "/" + ds_entry.getName())
-    if os.path.exists(ds_dir):
+    if resume:
+        if workers <= 0:
+            print("Resume requires parallel mode (--workers)",
+                file = sys.stderr)
+            assert False
+        if not os.path.exists(ds_dir + "/chunks~/setup.json"):
+            print("No interrupted parallel creation to resume:", ds_dir,
+                file = sys.stderr)
+            assert False
+        print("Resume creation of dataset:", ds_dir, file = sys.stderr)
+    elif os.path.exists(ds_dir):
         print("Dataset exists:", ds_dir, file = sys.stderr)
         assert False
-    os.mkdir(ds_dir)
+    else:
+        os.mkdir(ds_dir)
 
     mongo_conn = MongoConnector(app_config["mongo-db"],
         app_config.get("mongo-host"), app_config.get("mongo-port"))
 
     createDS(ds_dir, mongo_conn, druid_adm,
         ds_entry.getName(), ds_entry.getSource(), ds_entry.getDSKind(),
-        ds_entry.getInv(), report_lines, no_druid_push)
+        ds_entry.getInv(), report_lines, no_druid_push = no_druid_push,
+        workers = workers, resume = resume)
     mongo_conn.close()
 
 #===============================================
@@ -333,6 +345,12 @@ if __name__ == '__main__':
         help = "Delay between work with multiple datasets, in seconds")
     parser.add_argument("--nodruidpush", action = "store_true",
         help = "No push into Druid, if mode = create")
+    parser.add_argument("--workers", type = int, default = 0,
+        help = "Number of processes for record preparation, "
+        "if mode = create, default = 0 (sequential)")
+    parser.add_argument("--resume", action = "store_true",
+        help = "Resume interrupted parallel creation, if mode = create, "
+        "requires --workers")
     parser.add_argument("names", nargs = "+", help = "Dataset name(s)")
     args = parser.parse_args()
 
@@ -445,7 +463,8 @@ if __name__ == '__main__':
             time.sleep(args.delay)
         if args.mode == "create":
             createDataSet(app_config, ds_entry, args.force,
-                druid_adm, args.reportlines, args.nodruidpush)
+                druid_adm, args.reportlines, args.nodruidpush,
+                args.workers, args.resume)
         elif args.mode == "drop":
             dropDataSet(app_config, ds_entry, druid_adm, False)
         elif args.mode == "druid-push":
@@ -20,6 +20,7 @@
 
 import sys, os, json, logging, signal
 from io import StringIO
+from itertools import chain
 
 from app.config.view_schema import defineViewSchema
 from app.config.a_config import AnfisaConfig
@@ -68,7 +69,7 @@ class AnfisaApp:
         cls.sMongoConn = MongoConnector(cls.sConfig["mongo-db"],
             cls.sConfig.get("mongo-host"), cls.sConfig.get("mongo-port"))
 
-        cls.sDruidAgent = DruidAgent(cls.sConfig)
+        cls.sDruidAgent = DruidAgent(cls.sConfig, cache_mode = True)
 
         cls.sDataVault = DataVault(cls, cls.sConfig["data-vault"],
             anfisaVariables)
@@ -127,12 +128,17 @@ class AnfisaApp:
         tags_info = tags_man.getTagListInfo() if tags_man is not None else None
 
         export_h = ExcelExport(cls.sConfig["export"]["excel-template"],
-            source_versions = source_versions, tags_info = tags_info)
+            source_versions = source_versions, tags_info = tags_info,
+            write_only = True)
         #exp_rep = _ExportReport(dir_name + debug_file_name,
         #    source_versions, tags_info)
-        for rec_no in rec_no_seq:
-            rec_data = ds_h.getRecordData(rec_no)
-            tags_data = tags_man.getRecTags(rec_no) if tags_man else None
+        tags_seq = [tags_man.getRecTags(rec_no) if tags_man else None
+            for rec_no in rec_no_seq]
+        order = export_h.order_variants(tags_seq)
+        rec_no_seq = [rec_no_seq[idx] for idx in order]
+        tags_seq = [tags_seq[idx] for idx in order]
+        for (rec_no, rec_data), tags_data in zip(
+                ds_h.getRecStorage().iterRecords(rec_no_seq), tags_seq):
             export_h.add_variant(rec_data, tags_data)
             #exp_rep.record(rec_data, tags_data)
         export_h.save(dir_name + fname)
@@ -187,8 +193,14 @@ class AnfisaApp:
 
             if isinstance(report, list) and report[0] == '!':
                 mode, content, add_headers = report[1:]
-                return serv_h.makeResponse(mode = mode,
-                    content = content, add_headers = add_headers)
+                if isinstance(content, str):
+                    return serv_h.makeResponse(mode = mode,
+                        content = content, add_headers = add_headers)
+                # generator of text chunks: response iterable is passed
+                # to WSGI server, so chunks are sent as they are ready
+                return chain(serv_h.makeResponse(mode = mode,
+                    content = "", add_headers = add_headers),
+                    (chunk.encode("utf-8") for chunk in content))
 
             return serv_h.makeResponse(mode = "json",
                 content = json.dumps(report))
@@ -0,0 +1,66 @@
+#  Copyright (c) 2019. Partners HealthCare and other members of
+#  Forome Association
+#
+#  Developed by Sergey Trifonov based on contributions by Joel Krier,
+#  Michael Bouzinier, Shamil Sunyaev and other members of Division of
+#  Genetics, Brigham and Women's Hospital
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from app.eval.variety import VarietyUnit
+from .val_stat import expandPackCounts
+
+#===============================================
+# Gene index for compound requests: genes of approximation unit are
+# posted onto variants of its column unit (the same for plain units,
+# base combined variants for variety units), so gene counts under
+# condition and gene restricted condition are evaluated on columns
+#===============================================
+class WS_GeneIndex:
+    def __init__(self, unit_h):
+        self.mUnit = unit_h
+        self.mColumnUnit = unit_h
+        if isinstance(unit_h, VarietyUnit):
+            self.mColumnUnit = unit_h.getBaseUnit()
+        self.mGeneNames = list(iter(unit_h.getVariantSet()))
+        self.mColumnNames = list(iter(self.mColumnUnit.getVariantSet()))
+        self.mPostings = None
+        if self.mColumnUnit is not unit_h:
+            separator = self.mColumnUnit.getDescr()["separator"]
+            gene_set = unit_h.getVariantSet()
+            self.mPostings = [gene_set.makeIdxSet(name.split(separator))
+                for name in self.mColumnNames]
+
+    def getUnit(self):
+        return self.mUnit
+
+    def evalGeneSet(self, condition, min_count):
+        counts = self.mColumnUnit.evalGroupCounts(condition)
+        if self.mPostings is not None:
+            counts = expandPackCounts(counts, self.mPostings)
+        return {self.mGeneNames[idx]
+            for idx, cnt in counts.items() if cnt >= max(1, min_count)}
+
+    def makeGeneSetCond(self, gene_names):
+        eval_space = self.mUnit.getEvalSpace()
+        if self.mPostings is None:
+            col_variants = sorted(gene_names)
+        else:
+            gene_idx_set = self.mUnit.getVariantSet().makeIdxSet(gene_names)
+            col_variants = [self.mColumnNames[idx]
+                for idx, idx_set in enumerate(self.mPostings)
+                if len(idx_set & gene_idx_set) > 0]
+        if len(col_variants) == 0:
+            return eval_space.getCondNone()
+        return eval_space.makeEnumCond(self.mColumnUnit, col_variants)
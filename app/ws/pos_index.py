@@ -0,0 +1,66 @@
+#  Copyright (c) 2019. Partners HealthCare and other members of
+#  Forome Association
+#
+#  Developed by Sergey Trifonov based on contributions by Joel Krier,
+#  Michael Bouzinier, Shamil Sunyaev and other members of Division of
+#  Genetics, Brigham and Women's Hospital
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from bitarray import bitarray
+
+#===============================================
+# Sorted position index of records: per chromosome arrays of start and
+# end positions ordered by start, locus ranges are resolved by binary
+# search into record bits
+#===============================================
+class WS_PositionIndex:
+    def __init__(self, eval_space, chrom_unit_h, start_unit_h, end_unit_h):
+        self.mRecCount = eval_space.getTotalCounts()[0]
+        chrom_names = list(iter(chrom_unit_h.getVariantSet()))
+        chrom_seq = defaultdict(list)
+        for rec_no in range(self.mRecCount):
+            pos_info = (start_unit_h.getRecVal(rec_no),
+                end_unit_h.getRecVal(rec_no), rec_no)
+            for idx in chrom_unit_h.getRecVal(rec_no):
+                chrom_seq[chrom_names[idx]].append(pos_info)
+        self.mChromEntries = dict()
+        for chrom, seq in chrom_seq.items():
+            seq.sort()
+            self.mChromEntries[chrom] = (
+                array('q', [info[0] for info in seq]),
+                array('q', [info[1] for info in seq]),
+                array('L', [info[2] for info in seq]))
+
+    def evalRecBits(self, loci):
+        ret = bitarray(self.mRecCount)
+        ret.setall(False)
+        for chrom, start, end in loci:
+            entry = self.mChromEntries.get(chrom)
+            if entry is None:
+                continue
+            starts, ends, rec_nos = entry
+            if start is None:
+                for rec_no in rec_nos:
+                    ret[rec_no] = True
+                continue
+            # insertions in VEP notation have start = end + 1
+            for idx in range(bisect_left(starts, start),
+                    bisect_right(starts, end + 1)):
+                if ends[idx] <= end:
+                    ret[rec_nos[idx]] = True
+        return ret
@@ -18,8 +18,8 @@
 #  limitations under the License.
 #
 
-from collections import defaultdict
 from copy import deepcopy
+from bitarray import bitarray
 
 from app.config.a_config import AnfisaConfig
 from .zone import ZoneH
@@ -28,8 +28,8 @@ from forome_tools.job_pool import ExecutionTask
 class TagsManager(ZoneH):
     def __init__(self, ds_h, panel_name):
         ZoneH.__init__(self, ds_h, "_tags")
-        self.mTagSets = defaultdict(set)
-        self.mMarkedSet = set()
+        self.mTagSets = dict()
+        self.mMarkedSet = None
         self.mCheckTags = ds_h.getStdItemData("panel._tags", panel_name)
         assert self.mCheckTags, f"Tag panel {panel_name} not found"
         self.refreshTags()
@@ -37,9 +37,19 @@ class TagsManager(ZoneH):
     def getName(self):
         return "_tags"
 
+    def _newRecMask(self):
+        ret = bitarray(self.getDS().getTotal())
+        ret.setall(False)
+        return ret
+
+    sPattTrue = bitarray('1')
+
+    def _recList(self, rec_mask):
+        return list(rec_mask.itersearch(self.sPattTrue))
+
     def refreshTags(self):
-        self.mTagSets = defaultdict(set)
-        self.mMarkedSet = set()
+        self.mTagSets = dict()
+        self.mMarkedSet = self._newRecMask()
         for tags_info in self.getDS().getSolEnv().iterEntries("tags"):
             rec_key, tags_data = tags_info["name"], tags_info["data"]
             if not tags_data:
@@ -47,8 +57,10 @@ class TagsManager(ZoneH):
             rec_no = self.getDS().getRecNoByKey(rec_key)
             if rec_no is not None:
                 for tag in tags_data.keys():
-                    self.mTagSets[tag].add(rec_no)
-                    self.mMarkedSet.add(rec_no)
+                    if tag not in self.mTagSets:
+                        self.mTagSets[tag] = self._newRecMask()
+                    self.mTagSets[tag][rec_no] = True
+                self.mMarkedSet[rec_no] = True
 
     def getOpTagList(self):
         return sorted(set(self.mTagSets.keys()) - set(self.mCheckTags))
@@ -104,15 +116,13 @@ class TagsManager(ZoneH):
             ret["upd-from"] = None
         return ret
 
-    def getRestrictF(self, variants):
-        return lambda rec_no: self.checkVariants(rec_no, variants)
-
-    def checkVariants(self, rec_no, variants):
+    def getRestrictMask(self, variants):
+        ret = self._newRecMask()
         for tag_name in variants:
             tag_set = self.mTagSets.get(tag_name)
-            if tag_set and rec_no in tag_set:
-                return True
-        return False
+            if tag_set is not None:
+                ret |= tag_set
+        return ret
 
     def reportSelectTag(self, tag_name):
         tag_list = self.getTagList()
@@ -122,9 +132,11 @@ class TagsManager(ZoneH):
             "tag-list": tag_list,
             "tag": tag_name,
             "tags-state": self.getDS().getSolEnv().getIntVersion("tags"),
-            "tags-rec-list": sorted(self.mMarkedSet)}
+            "tags-rec-list": self._recList(self.mMarkedSet)}
         if tag_name:
-            rep["tag-rec-list"] = sorted(self.mTagSets[tag_name])
+            tag_set = self.mTagSets.get(tag_name)
+            rep["tag-rec-list"] = (self._recList(tag_set)
+                if tag_set is not None else [])
         return rep
 
     def tagIsProper(self, tag_name):
@@ -168,21 +180,13 @@ class TagsManager(ZoneH):
                 "Too long tag name (%d+): %s" % (max_tag_name_length, rec_key))
             to_update_seq.append((rec_key, simple_tag_data))
 
-        cur_progess = 0
+        notify_func = None
         if task_h is not None:
-            total = len(to_update_seq)
-            step_cnt = total // 100
-            next_cnt = step_cnt
-        else:
-            next_cnt = 0
-
-        for rec_key, tags_data in to_update_seq:
-            while next_cnt > 0 and idx > next_cnt:
-                next_cnt += step_cnt
-                cur_progess += 1
-                task_h.setStatus("Update records %d%s" % (cur_progess, '%'))
-            self.getDS().getSolEnv().modifyEntry(self.getDS().getName(),
-                "tags", "UPDATE", rec_key, tags_data)
+            total = max(1, len(to_update_seq))
+            notify_func = lambda cnt: task_h.setStatus(
+                "Update records %d%s" % ((100 * cnt) // total, '%'))
+        self.getDS().getSolEnv().updateEntries(self.getDS().getName(),
+            "tags", to_update_seq, notify_func = notify_func)
         if task_h is not None:
             task_h.setStatus("Done")
 
@@ -198,6 +202,6 @@ class MacroTaggingOperation(ExecutionTask):
         return "macro-tagging"
 
     def execIt(self):
-        self.mTagsMan.macroTaggingOp(self.mTagName, self.mRecKeys)
+        self.mTagsMan.macroTaggingOp(self.mTagName, self.mRecKeys, self)
         return {"tags-state":
                 self.mTagsMan.getDS().getSolEnv().getIntVersion("tags")}
@@ -19,6 +19,9 @@
 #
 
 from collections import Counter
+from itertools import compress
+from operator import itemgetter
+from bisect import bisect_left
 
 #===============================================
 class NumDiapStat:
@@ -46,6 +49,19 @@ class NumDiapStat:
                 self.mCurGroupNo = group_no
                 self.mGroupCount += 1
 
+    def regValueSeq(self, values, group_count = None):
+        if len(values) == 0:
+            return
+        v_min, v_max = min(values), max(values)
+        if self.mCntDef == 0:
+            self.mMin, self.mMax = v_min, v_max
+        else:
+            self.mMin = min(self.mMin, v_min)
+            self.mMax = max(self.mMax, v_max)
+        self.mCntDef += len(values)
+        if self.mGroupCount is not None:
+            self.mGroupCount += group_count
+
     def prepareHistogram(self, unit_h):
         return NumHistogramBuilder(self.mMin, self.mMax,
             self.mCntDef, unit_h)
@@ -136,6 +152,16 @@ class NumHistogramBuilder:
                 return
         self.mInfo[-1][-1] += 1
 
+    def regValueSeq(self, values):
+        sorted_values = sorted(values)
+        hist = self.mInfo[-1]
+        prev_cnt = 0
+        for idx, cell_value in enumerate(self.mIntervals):
+            cnt = bisect_left(sorted_values, cell_value)
+            hist[idx] += cnt - prev_cnt
+            prev_cnt = cnt
+        hist[-1] += len(sorted_values) - prev_cnt
+
 #===============================================
 class EnumStat:
     def __init__(self, variant_set, detailed = False):
@@ -147,6 +173,7 @@ class EnumStat:
             self.mCurGroupNo = None
             self.mGroupSet = set()
             self.mVarTrSet = [set() for _ in self.mVariantSet]
+            self.mTrStat = Counter()
 
     def isDefined(self):
         for cnt in self.mStat.values():
@@ -177,6 +204,20 @@ class EnumStat:
             if transcript_id is not None:
                 self.mVarTrSet[val].add(transcript_id)
 
+    def regCounts(self, counts, group_counts = None, tr_counts = None):
+        var_count = len(self.mVariantSet)
+        for val, cnt in counts.items():
+            if 0 <= val < var_count:
+                self.mStat[val] += cnt
+        if group_counts is not None:
+            for val, cnt in group_counts.items():
+                if 0 <= val < var_count:
+                    self.mGroupStat[val] += cnt
+        if tr_counts is not None:
+            for val, cnt in tr_counts.items():
+                if 0 <= val < var_count:
+                    self.mTrStat[val] += cnt
+
     def makeResult(self):
         if self.mGroupStat is not None:
             self.flushGroup()
@@ -185,9 +226,46 @@ class EnumStat:
             info = [variant, self.mStat.get(idx, 0)]
             if self.mGroupStat is not None:
                 info.insert(1, self.mGroupStat.get(idx, 0))
-                info.append(len(self.mVarTrSet[idx]))
+                info.append(len(self.mVarTrSet[idx])
+                    + self.mTrStat.get(idx, 0))
             rep_list.append(info)
         return rep_list
 
     def reportResult(self, ret_handle):
         ret_handle["variants"] = self.makeResult()
+
+#===============================================
+# Bulk statistics over unit arrays:
+#   sel_bits is selection bitarray of the same length as array
+#===============================================
+def collectNumStat(unit_h, val_array, sel_bits,
+        detailed = False, group_count = None):
+    values = list(compress(val_array, sel_bits))
+    num_stat = NumDiapStat(detailed)
+    num_stat.regValueSeq(values, group_count)
+    builder_h = num_stat.prepareHistogram(unit_h)
+    if builder_h.isOK():
+        builder_h.regValueSeq(values)
+    return num_stat, builder_h
+
+def countSelected(val_array, sel_bits):
+    return Counter(compress(val_array, sel_bits))
+
+def countSelectedPairs(key_array, val_array, sel_bits):
+    # count of distinct keys for each value
+    return Counter(map(itemgetter(1), set(zip(
+        compress(key_array, sel_bits), compress(val_array, sel_bits)))))
+
+def expandPackCounts(pack_counts, pack_set_seq):
+    ret = Counter()
+    for pack_idx, cnt in pack_counts.items():
+        for idx in pack_set_seq[pack_idx]:
+            ret[idx] += cnt
+    return ret
+
+def countSelectedPackPairs(key_array, pack_array, sel_bits, pack_set_seq):
+    pairs = set()
+    for key, pack_idx in set(zip(compress(key_array, sel_bits),
+            compress(pack_array, sel_bits))):
+        pairs.update((key, idx) for idx in pack_set_seq[pack_idx])
+    return Counter(map(itemgetter(1), pairs))
@@ -18,18 +18,21 @@
 #  limitations under the License.
 #
 
-import json
+import json, logging
 from array import array
 from xml.sax.saxutils import escape
 
+from forome_tools.log_err import logException
 from app.config.a_config import AnfisaConfig
+from app.eval.variety import VarietyUnit
 from app.model.rest_api import RestAPI
 from app.model.dataset import DataSet
 
 from .rules import RulesUnit
 from .tags_man import TagsManager, MacroTaggingOperation
 from .zone import FilterZoneH, PanelZoneH
-from .ws_unit import loadWS_Unit
+from .ws_unit import loadWS_Unit, WS_Unit
+from .ws_snapshot import SnapshotWriter, SnapshotReader
 from .ws_space import WS_EvalSpace
 from .ws_io import exportWS
 from .val_stat import EnumStat
@@ -41,30 +44,13 @@ class Workspace(DataSet):
         assert self.getDSKind() == "ws"
         assert self.getRecStorage().getKind() == "disk", (
             "Missing storage kind: " + self.getRecStorage().getKind())
-        self.mTabRecRand = array('q')
-        self.mTabRecKey  = []
-        self.mTabRecColor  = []
-        self.mTabRecLabel = []
         self.mKey2Idx = None
-        self.mEvalSpace = WS_EvalSpace(self,
-            self._makeRecArrayFunc(self.mTabRecRand))
-
-        self.mZygArrays = []
-        for zyg_name in self.getZygUnitNames():
-            var_array = array('b')
-            self.mZygArrays.append(var_array)
-            self.mEvalSpace._addZygUnit(zyg_name,
-                self._makeRecArrayFunc(var_array))
-
-        transcript_id_unit = None
-        for unit_data in self.getFltSchema():
-            unit_h = loadWS_Unit(self.mEvalSpace, unit_data)
-            if unit_h is not None:
-                self.mEvalSpace._addUnit(unit_h)
-                if unit_h.isTranscriptID() and transcript_id_unit is None:
-                    transcript_id_unit = unit_h.getName()
-        self._loadPData()
-        self._loadFData()
+        transcript_id_unit = self._setupColumns()
+        if not self._loadSnapshot():
+            self._loadPData()
+            self._loadFData()
+            self._saveSnapshot()
+        self.mKey2Idx = {key: idx for idx, key in enumerate(self.mTabRecKey)}
         self.mRulesUnit = RulesUnit(self)
         self.mEvalSpace._insertUnit(self.mRulesUnit, insert_idx = 0)
         if not transcript_id_unit:
@@ -96,6 +82,31 @@ class Workspace(DataSet):
         for dtree_h in self.iterSolEntries("dtree"):
             dtree_h.activate()
 
+    def _setupColumns(self):
+        # eval space and units with empty columns
+        self.mTabRecRand = array('q')
+        self.mTabRecKey  = []
+        self.mTabRecColor  = []
+        self.mTabRecLabel = []
+        self.mEvalSpace = WS_EvalSpace(self,
+            self._makeRecArrayFunc(self.mTabRecRand), self.mTabRecRand)
+
+        self.mZygArrays = []
+        for zyg_name in self.getZygUnitNames():
+            var_array = array('b')
+            self.mZygArrays.append(var_array)
+            self.mEvalSpace._addZygUnit(zyg_name,
+                self._makeRecArrayFunc(var_array), var_array)
+
+        transcript_id_unit = None
+        for unit_data in self.getFltSchema():
+            unit_h = loadWS_Unit(self.mEvalSpace, unit_data)
+            if unit_h is not None:
+                self.mEvalSpace._addUnit(unit_h)
+                if unit_h.isTranscriptID() and transcript_id_unit is None:
+                    transcript_id_unit = unit_h.getName()
+        return transcript_id_unit
+
     @staticmethod
     def _makeRecArrayFunc(val_array):
         return lambda rec_no: val_array[rec_no]
@@ -109,7 +120,6 @@ class Workspace(DataSet):
                     ("_label", self.mTabRecLabel)):
                 tab.append(pre_data.get(key))
         assert len(self.mTabRecRand) == self.getTotal()
-        self.mKey2Idx = {key: idx for idx, key in enumerate(self.mTabRecKey)}
 
     def _loadFData(self):
         for rec_no, f_data in self.getRecStorage().iterFData():
@@ -121,6 +131,80 @@ class Workspace(DataSet):
                 self.mZygArrays[idx].append(
                     f_data.get(zyg_unit_h.getName()))
 
+    def _iterColumnUnits(self):
+        for unit_h in self.mEvalSpace.iterUnits():
+            if isinstance(unit_h, VarietyUnit):
+                yield unit_h.getBaseUnit()
+            elif isinstance(unit_h, WS_Unit):
+                yield unit_h
+
+    def _getSnapshotPath(self):
+        return self.getDirPath() + "/snapshot"
+
+    def _makeSnapshotStamp(self):
+        stamp = []
+        for fname in ("dsinfo.json", "fdata.json.gz", "pdata.json.gz"):
+            fstat = self.getDataVault().checkFileStat(
+                self.getDirPath() + "/" + fname)
+            stamp.append(list(fstat) if fstat is not None else None)
+        return stamp
+
+    def _loadSnapshot(self):
+        if not AnfisaConfig.configOption("ws.snapshot"):
+            return False
+        snap_in = SnapshotReader(self._getSnapshotPath(),
+            self._makeSnapshotStamp())
+        if not snap_in.isOK():
+            return False
+        try:
+            self.mEvalSpace._loadItemGroups(
+                snap_in.getArray("$tr-counts", 'L'))
+            assert self.mEvalSpace.getGroupCount() == self.getTotal()
+            snap_in.loadArray("$rand", self.mTabRecRand)
+            self.mTabRecKey.extend(snap_in.getData("$key"))
+            self.mTabRecColor.extend(snap_in.getData("$color"))
+            self.mTabRecLabel.extend(snap_in.getData("$label"))
+            for idx, zyg_unit_h in enumerate(
+                    self.mEvalSpace.iterZygUnits()):
+                snap_in.loadArray("$zyg:" + zyg_unit_h.getName(),
+                    self.mZygArrays[idx])
+            for unit_h in self._iterColumnUnits():
+                unit_h.loadColumns(snap_in)
+        except Exception:
+            logException("Failed to load snapshot for workspace "
+                + self.getName())
+            snap_in.drop()
+            # columns may be partially filled: start over from empty ones
+            self._setupColumns()
+            return False
+        logging.info("Workspace %s loaded from snapshot" % self.getName())
+        return True
+
+    def _saveSnapshot(self):
+        if not AnfisaConfig.configOption("ws.snapshot"):
+            return
+        snap_out = None
+        try:
+            snap_out = SnapshotWriter(self._getSnapshotPath(),
+                self._makeSnapshotStamp())
+            snap_out.putArray("$tr-counts",
+                array('L', self.mEvalSpace.iterTranstriptCounts()))
+            snap_out.putArray("$rand", self.mTabRecRand)
+            snap_out.putData("$key", self.mTabRecKey)
+            snap_out.putData("$color", self.mTabRecColor)
+            snap_out.putData("$label", self.mTabRecLabel)
+            for idx, zyg_unit_h in enumerate(self.mEvalSpace.iterZygUnits()):
+                snap_out.putArray("$zyg:" + zyg_unit_h.getName(),
+                    self.mZygArrays[idx])
+            for unit_h in self._iterColumnUnits():
+                unit_h.saveColumns(snap_out)
+            snap_out.close()
+        except Exception:
+            logException("Failed to save snapshot for workspace "
+                + self.getName())
+            if snap_out is not None:
+                snap_out.drop()
+
     def getEvalSpace(self):
         return self.mEvalSpace
 
@@ -136,10 +220,6 @@ class Workspace(DataSet):
                 return zone_h
         return None
 
-    @staticmethod
-    def makeNegation(func_f):
-        return lambda rec_no: not func_f(rec_no)
-
     def checkSupportStat(self, name, condition):
         if name == "_tags":
             ret_handle = {"name": "_tags", "kind": "support"}
@@ -150,18 +230,22 @@ class Workspace(DataSet):
             return ret_handle
         return None
 
-    def restrictZoneF(self, zone_data):
-        ret_seq = []
+    def restrictZoneMask(self, zone_data):
+        ret = None
         if zone_data is None:
-            return ret_seq
+            return ret
         for zone_info in json.loads(zone_data):
             zone_name, zone_variants = zone_info[:2]
-            func_f = self.getZone(zone_name).getRestrictF(zone_variants)
+            rec_mask = self.getZone(zone_name).getRestrictMask(zone_variants)
             if len(zone_info) > 2:
                 assert zone_info[2] is False
-                func_f = self.makeNegation(func_f)
-            ret_seq.append(func_f)
-        return ret_seq
+                rec_mask = ~rec_mask
+            ret = rec_mask if ret is None else ret & rec_mask
+        return ret
+
+    def restrictZones(self, condition, zone_data):
+        return self.mEvalSpace.restrictCondition(condition,
+            self.restrictZoneMask(zone_data))
 
     def getLastAspectID(self):
         return AnfisaConfig.configOption("aspect.tags.name")
@@ -189,12 +273,8 @@ class Workspace(DataSet):
         return enumerate(self.mTabRecKey)
 
     def fiterRecords(self, condition, zone_data = None):
-        zone_fseq = self.restrictZoneF(zone_data)
-        rec_no_seq = []
-        for rec_no, _ in condition.iterSelection():
-            if all(zone_f(rec_no) for zone_f in zone_fseq):
-                rec_no_seq.append(rec_no)
-        return rec_no_seq
+        condition = self.restrictZones(condition, zone_data)
+        return self.mEvalSpace.evalRecSeq(condition)
 
     def getRecFilters(self, rec_no):
         ret_seq = []
@@ -221,15 +301,14 @@ class Workspace(DataSet):
     def rq__ws_list(self, rq_args):
         filter_h = self._getArgCondFilter(rq_args)
         records = []
-        condition = filter_h.getCondition()
-        zone_fseq = self.restrictZoneF(rq_args.get("zone"))
+        condition = self.restrictZones(filter_h.getCondition(),
+            rq_args.get("zone"))
         for rec_no, rec_it_map in condition.iterSelection():
-            if all(zone_f(rec_no) for zone_f in zone_fseq):
-                records.append(self.reportRecord(rec_no, rec_it_map))
+            records.append(self.reportRecord(rec_no, rec_it_map))
         ret_handle = {
             "ds": self.getName(),
             "total-counts": self.mEvalSpace.getTotalCounts(),
-            "filtered-counts": condition.getCounts(zone_fseq),
+            "filtered-counts": condition.getCounts(),
             "records": records}
         self.visitEvaluation(filter_h, ret_handle)
         return ret_handle
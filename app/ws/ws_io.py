@@ -71,6 +71,8 @@ def exportWS(ds_h, with_support, with_root_doc):
 
         if os.path.exists(ds_dir + "stat.json"):
             tar.add(ds_dir + "stat.json", arcname = "stat.json")
+        if os.path.exists(ds_dir + "pdata.ixbz2"):
+            tar.add(ds_dir + "pdata.ixbz2", arcname = "pdata.ixbz2")
         jsDataToTar(tar, "dsinfo.json", ds_info)
         if support_data is not None:
             jsDataToTar(tar, "support.json", support_data)
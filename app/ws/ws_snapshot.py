@@ -0,0 +1,148 @@
+#  Copyright (c) 2019. Partners HealthCare and other members of
+#  Forome Association
+#
+#  Developed by Sergey Trifonov based on contributions by Joel Krier,
+#  Michael Bouzinier, Shamil Sunyaev and other members of Division of
+#  Genetics, Brigham and Women's Hospital
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os, json, mmap, shutil, logging
+from array import array
+from bitarray import bitarray
+
+#===============================================
+# Binary columnar snapshot of workspace data:
+#   directory <ws>/snapshot/ with index.json and one .bin file per column
+#===============================================
+class SnapshotWriter:
+    sFormatVersion = 1
+
+    def __init__(self, dir_path, stamp):
+        self.mDirPath = dir_path
+        self.mTmpPath = dir_path + ".tmp~"
+        self.mStamp = stamp
+        self.mEntries = dict()
+        if os.path.exists(self.mTmpPath):
+            shutil.rmtree(self.mTmpPath)
+        os.mkdir(self.mTmpPath)
+
+    def _newFile(self, key, kind):
+        assert key not in self.mEntries, "Snapshot key duplication: " + key
+        fname = "%05d.bin" % len(self.mEntries)
+        self.mEntries[key] = {"kind": kind, "file": fname}
+        return self.mEntries[key], self.mTmpPath + "/" + fname
+
+    def putArray(self, key, val_array):
+        entry, fpath = self._newFile(key, "array")
+        entry["type"] = val_array.typecode
+        entry["itemsize"] = val_array.itemsize
+        entry["len"] = len(val_array)
+        with open(fpath, "wb") as outp:
+            val_array.tofile(outp)
+
+    def putBitArray(self, key, bit_array):
+        entry, fpath = self._newFile(key, "bitarray")
+        entry["len"] = len(bit_array)
+        entry["endian"] = bit_array.endian()
+        with open(fpath, "wb") as outp:
+            bit_array.tofile(outp)
+
+    def putData(self, key, data):
+        entry, fpath = self._newFile(key, "json")
+        with open(fpath, "w", encoding = "utf-8") as outp:
+            outp.write(json.dumps(data, ensure_ascii = False))
+
+    def close(self):
+        with open(self.mTmpPath + "/index.json",
+                "w", encoding = "utf-8") as outp:
+            outp.write(json.dumps({
+                "version": self.sFormatVersion,
+                "stamp": self.mStamp,
+                "entries": self.mEntries}, sort_keys = True, indent = 4))
+        if os.path.exists(self.mDirPath):
+            shutil.rmtree(self.mDirPath)
+        os.rename(self.mTmpPath, self.mDirPath)
+
+    def drop(self):
+        if os.path.exists(self.mTmpPath):
+            shutil.rmtree(self.mTmpPath)
+
+#===============================================
+class SnapshotReader:
+    def __init__(self, dir_path, stamp):
+        self.mDirPath = dir_path
+        self.mEntries = None
+        index_path = self.mDirPath + "/index.json"
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding = "utf-8") as inp:
+            index_info = json.loads(inp.read())
+        if index_info.get("version") != SnapshotWriter.sFormatVersion:
+            logging.info("Snapshot %s: format is out of date" % dir_path)
+            return
+        if index_info.get("stamp") != stamp:
+            logging.info("Snapshot %s: data is out of date" % dir_path)
+            return
+        self.mEntries = index_info["entries"]
+
+    def isOK(self):
+        return self.mEntries is not None
+
+    def drop(self):
+        self.mEntries = None
+        if os.path.exists(self.mDirPath):
+            shutil.rmtree(self.mDirPath)
+
+    def _getEntry(self, key, kind):
+        entry = self.mEntries.get(key)
+        assert entry is not None, "Snapshot: missing key " + key
+        assert entry["kind"] == kind, (
+            f"Snapshot: kind conflict for {key}: {entry['kind']}/{kind}")
+        return entry, self.mDirPath + "/" + entry["file"]
+
+    @staticmethod
+    def _mapFile(fpath, func):
+        with open(fpath, "rb") as inp:
+            if os.fstat(inp.fileno()).st_size == 0:
+                return func(b"")
+            with mmap.mmap(inp.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+                return func(mm)
+
+    def loadArray(self, key, val_array):
+        entry, fpath = self._getEntry(key, "array")
+        assert (entry["type"] == val_array.typecode
+            and entry["itemsize"] == val_array.itemsize), (
+            "Snapshot: array type conflict for " + key)
+        assert len(val_array) == 0, "Snapshot: array is not empty for " + key
+        self._mapFile(fpath, val_array.frombytes)
+        assert len(val_array) == entry["len"], (
+            "Snapshot: bad array length for " + key)
+        return val_array
+
+    def getArray(self, key, typecode):
+        return self.loadArray(key, array(typecode))
+
+    def getBitArray(self, key):
+        entry, fpath = self._getEntry(key, "bitarray")
+        ret = bitarray(endian = entry["endian"])
+        self._mapFile(fpath, ret.frombytes)
+        del ret[entry["len"]:]
+        assert len(ret) == entry["len"], (
+            "Snapshot: bad bitarray length for " + key)
+        return ret
+
+    def getData(self, key):
+        _, fpath = self._getEntry(key, "json")
+        with open(fpath, "r", encoding = "utf-8") as inp:
+            return json.loads(inp.read())
@@ -18,29 +18,55 @@
 #  limitations under the License.
 #
 
+import json
+from array import array
+from hashlib import md5
+from itertools import compress
+from threading import Lock
 from bitarray import bitarray
+from cachetools import LRUCache
+
+from app.config.a_config import AnfisaConfig
 
 from app.eval.eval_space import (EvalSpace, Eval_Condition,
     CondSupport_None, CondSupport_All)
 from app.eval.condition import ConditionMaker, ZYG_BOUNDS_VAL
 from .ws_unit import WS_ReservedNumUnit
+from .gene_index import WS_GeneIndex
+from .pos_index import WS_PositionIndex
 
 #===============================================
 class WS_EvalSpace(EvalSpace):
-    def __init__(self, ds_h, rec_rand_f):
+    def __init__(self, ds_h, rec_rand_f, rec_rand_array = None):
         EvalSpace.__init__(self, ds_h)
         self.mTotalCounts = [0, 0, 0]
         self.mGroups = []
         self.mTrCounts = []
         self.mZygRUnits = []
         self.mTrIdUnit = None
+        self.mGroupWidths = None
+        self.mItemsMask = None
+        self.mItemGroups = None
+        self.mAtomCache = LRUCache(
+            AnfisaConfig.configOption("ws.atom.cache.mem"),
+            getsizeof = self.condMemSize)
+        self.mAtomCacheLock = Lock()
+        self.mZygMaskCache = LRUCache(
+            AnfisaConfig.configOption("ws.zyg.cache.mem"),
+            getsizeof = self.maskMemSize)
+        self.mZygMaskLock = Lock()
+        self.mGeneIndices = dict()
+        self.mGeneIndexLock = Lock()
+        self.mPosIndices = dict()
+        self.mPosIndexLock = Lock()
 
         self.mRandRUnit = WS_ReservedNumUnit(
-            self, "_rand", rec_rand_f)
+            self, "_rand", rec_rand_f, val_array = rec_rand_array)
         self._addReservedUnit(self.mRandRUnit)
 
-    def _addZygUnit(self, zyg_name, zyg_func):
-        r_unit_h = WS_ReservedNumUnit(self, zyg_name, zyg_func)
+    def _addZygUnit(self, zyg_name, zyg_func, zyg_array = None):
+        r_unit_h = WS_ReservedNumUnit(self, zyg_name, zyg_func,
+            val_array = zyg_array)
         self.mZygRUnits.append(r_unit_h)
         self._addReservedUnit(r_unit_h)
 
@@ -53,12 +79,96 @@ class WS_EvalSpace(EvalSpace):
     def getCondKind(self):
         return "ws"
 
+    @staticmethod
+    def condMemSize(condition):
+        return (len(condition.getBitArray()) + 7) // 8
+
+    @staticmethod
+    def maskMemSize(rec_mask):
+        return (len(rec_mask) + 7) // 8
+
+    @staticmethod
+    def condContentKey(condition):
+        bit_arr = condition.getBitArray()
+        return "%d:%s" % (len(bit_arr), md5(bit_arr.tobytes()).hexdigest())
+
+    def buildAtomCondition(self, unit_h, cond_data, eval_h):
+        # atoms with errors are not cached: errors are reported to eval_h
+        if cond_data[0] == "enum" and len(cond_data[3]) == 0:
+            return unit_h.buildCondition(cond_data, eval_h)
+        key = json.dumps(cond_data, sort_keys = True)
+        with self.mAtomCacheLock:
+            ret = self.mAtomCache.get(key)
+        if ret is None:
+            ret = unit_h.buildCondition(cond_data, eval_h)
+            if (ret is not None
+                    and self.condMemSize(ret) <= self.mAtomCache.maxsize):
+                with self.mAtomCacheLock:
+                    self.mAtomCache[key] = ret
+        return ret
+
     def getZygUnit(self, idx):
         return self.mZygRUnits[idx]
 
     def iterZygUnits(self):
         return iter(self.mZygRUnits)
 
+    def _getZygMask(self, idx, zyg_bounds):
+        # genotype columns of samples form records x samples matrix,
+        # record masks of its columns are cached per zygosity bounds
+        key = (idx, zyg_bounds)
+        with self.mZygMaskLock:
+            rec_mask = self.mZygMaskCache.get(key)
+        if rec_mask is None:
+            rec_mask = self.mZygRUnits[idx].evalNumMask(
+                *ZYG_BOUNDS_VAL[zyg_bounds])
+            if (rec_mask is not None and self.maskMemSize(rec_mask)
+                    <= self.mZygMaskCache.maxsize):
+                with self.mZygMaskLock:
+                    self.mZygMaskCache[key] = rec_mask
+        return rec_mask
+
+    def makeZygScenarioCond(self, scenario_seq):
+        rec_bits = None
+        for zyg_bounds, sample_idxs in scenario_seq:
+            for idx in sample_idxs:
+                rec_mask = self._getZygMask(idx, zyg_bounds)
+                if rec_mask is None:
+                    return EvalSpace.makeZygScenarioCond(self, scenario_seq)
+                if rec_bits is None:
+                    rec_bits = rec_mask.copy()
+                else:
+                    rec_bits &= rec_mask
+        if rec_bits is None:
+            return self.getCondAll()
+        return WS_CondZygScenario(self, scenario_seq,
+            self.broadcastGroupBits(rec_bits))
+
+    def getGeneIndex(self, unit_h):
+        with self.mGeneIndexLock:
+            gene_index = self.mGeneIndices.get(unit_h.getName())
+            if gene_index is None or gene_index.getUnit() is not unit_h:
+                gene_index = WS_GeneIndex(unit_h)
+                self.mGeneIndices[unit_h.getName()] = gene_index
+        return gene_index
+
+    def _getPositionIndex(self, map_units):
+        key = (map_units["chrom"], map_units["start"], map_units["end"])
+        with self.mPosIndexLock:
+            pos_index = self.mPosIndices.get(key)
+            if pos_index is None:
+                pos_index = WS_PositionIndex(self,
+                    *[self.getUnit(unit_name) for unit_name in key])
+                self.mPosIndices[key] = pos_index
+        return pos_index
+
+    def makeRegionCond(self, map_units, loci):
+        if len(loci) == 0:
+            return self.getCondNone()
+        rec_bits = self._getPositionIndex(map_units).evalRecBits(loci)
+        return WS_CondRegion(self, map_units, loci,
+            self.broadcastGroupBits(rec_bits))
+
     def addItemGroup(self, grp_size):
         self.mTrCounts.append(grp_size)
         offset_from = self.mTotalCounts[1]
@@ -66,6 +176,13 @@ class WS_EvalSpace(EvalSpace):
         self.mGroups.append((offset_from, offset_to))
         self.mTotalCounts[0] += 1
         self.mTotalCounts[1] = offset_to
+        self.mGroupWidths = None
+        self.mItemsMask = None
+        self.mItemGroups = None
+
+    def _loadItemGroups(self, tr_counts):
+        for grp_size in tr_counts:
+            self.addItemGroup(grp_size)
 
     def getTotalCounts(self):
         return self.mTotalCounts
@@ -91,6 +208,65 @@ class WS_EvalSpace(EvalSpace):
     def getCondAll(self):
         return WS_All(self)
 
+    def _getGroupWidths(self):
+        if self.mGroupWidths is None:
+            self.mGroupWidths = array('L',
+                [max(1, tr_count) for tr_count in self.mTrCounts])
+        return self.mGroupWidths
+
+    def broadcastGroupBits(self, rec_bits):
+        assert len(rec_bits) == self.mTotalCounts[0]
+        if self.mTotalCounts[0] == self.mTotalCounts[1]:
+            return rec_bits
+        code_table = dict()
+        for width in set(self._getGroupWidths()):
+            for val in (0, 1):
+                code_table[(val, width)] = bitarray([val]) * width
+        ret = bitarray()
+        ret.encode(code_table, zip(rec_bits, self._getGroupWidths()))
+        return ret
+
+    def _getItemsMask(self):
+        # items of groups without transcripts are never selected
+        if self.mItemsMask is None:
+            self.mItemsMask = self.broadcastGroupBits(
+                bitarray([tr_count > 0 for tr_count in self.mTrCounts]))
+        return self.mItemsMask
+
+    def getItemGroupArray(self):
+        if self.mItemGroups is None:
+            self.mItemGroups = array('L')
+            for group_no, width in enumerate(self._getGroupWidths()):
+                self.mItemGroups.extend([group_no] * width)
+        return self.mItemGroups
+
+    def getTranscriptIdArray(self):
+        return self.mTrIdUnit.getItValArray()
+
+    def collapseItemBits(self, item_bits):
+        if self.mTotalCounts[0] == self.mTotalCounts[1]:
+            return item_bits
+        ret = bitarray(self.mTotalCounts[0])
+        ret.setall(False)
+        for group_no in set(compress(self.getItemGroupArray(), item_bits)):
+            ret[group_no] = True
+        return ret
+
+    def makeUnitMaskCond(self, unit_h, bit_arr):
+        if bit_arr is None:
+            return None, None
+        if not unit_h.isDetailed():
+            return self.broadcastGroupBits(bit_arr), False
+        assert len(bit_arr) == self.mTotalCounts[1]
+        return bit_arr & self._getItemsMask(), True
+
+    def restrictCondition(self, condition, rec_mask):
+        if rec_mask is None:
+            return condition
+        return WS_Condition(self, "restricted",
+            condition.getBitArray() & self.broadcastGroupBits(rec_mask),
+            detailed = condition.isDetailed())
+
     def mapTranscriptID(self, pos_idx):
         return self.mTrIdUnit.getItValIdx(pos_idx)
 
@@ -156,6 +332,7 @@ class WS_Condition(Eval_Condition):
         Eval_Condition.__init__(self, eval_space, cond_type)
         self.mBitArray = bit_arr
         self.mDetailed = detailed
+        self.mRecMask = None
         if self.mBitArray is not None:
             assert fill_groups_f is None and fill_items_f is None
             assert detailed is not None
@@ -185,6 +362,12 @@ class WS_Condition(Eval_Condition):
     def getBitArray(self):
         return self.mBitArray
 
+    def getRecMask(self):
+        if self.mRecMask is None:
+            self.mRecMask = self.getEvalSpace().collapseItemBits(
+                self.mBitArray)
+        return self.mRecMask
+
     def isDetailed(self):
         return self.mDetailed
 
@@ -213,20 +396,10 @@ class WS_Condition(Eval_Condition):
 
     sPattTrue = bitarray('1')
 
-    def getCounts(self, zone_fseq = None):
-        count_grp, count_items = 0, 0
-        eval_space = self.getEvalSpace()
-        tr_set = set()
-        for rec_no, rec_it_map in self.iterSelection():
-            if (zone_fseq is not None
-                    and not all(zone_f(rec_no) for zone_f in zone_fseq)):
-                continue
-            count_grp += 1
-            count_items += rec_it_map.count()
-            idx_start, _ = eval_space.getGroupPos(rec_no)
-            for idx_pos in rec_it_map.itersearch(self.sPattTrue):
-                tr_set.add(eval_space.mapTranscriptID(idx_start + idx_pos))
-        return [count_grp, count_items, len(tr_set)]
+    def getCounts(self):
+        tr_id_array = self.getEvalSpace().getTranscriptIdArray()
+        return [self.getRecMask().count(), self.mBitArray.count(),
+            len(set(compress(tr_id_array, self.mBitArray)))]
 
     def getItemCount(self):
         return self.mBitArray.count()
@@ -248,6 +421,12 @@ class WS_Condition(Eval_Condition):
 class WS_CondNumeric(WS_Condition):
     @classmethod
     def create(cls, unit_h, min_val, min_eq, max_val, max_eq):
+        data = (unit_h.getName(), min_val, min_eq, max_val, max_eq)
+        bit_arr, detailed = unit_h.getEvalSpace().makeUnitMaskCond(unit_h,
+            unit_h.evalNumMask(min_val, min_eq, max_val, max_eq))
+        if bit_arr is not None:
+            return cls(unit_h.getEvalSpace(), None, None, data,
+                bit_arr, detailed)
         eval_func = WS_EvalSpace.numericFilterFunc(
             min_val, min_eq, max_val, max_eq)
         if unit_h.isDetailed():
@@ -258,12 +437,13 @@ class WS_CondNumeric(WS_Condition):
             def fill_groups_f(rec_no):
                 return eval_func(unit_h.getRecVal(rec_no))
             fill_items_f = None
-        return cls(unit_h.getEvalSpace(), fill_groups_f, fill_items_f,
-            (unit_h.getName(), min_val, min_eq, max_val, max_eq))
+        return cls(unit_h.getEvalSpace(), fill_groups_f, fill_items_f, data)
 
-    def __init__(self, eval_space, fill_groups_f, fill_items_f, data):
-        WS_Condition.__init__(self, eval_space, "numeric",
-            fill_groups_f = fill_groups_f, fill_items_f = fill_items_f)
+    def __init__(self, eval_space, fill_groups_f, fill_items_f, data,
+            bit_arr = None, detailed = None):
+        WS_Condition.__init__(self, eval_space, "numeric", bit_arr,
+            fill_groups_f = fill_groups_f, fill_items_f = fill_items_f,
+            detailed = detailed)
         self.mData = data
 
     def getData(self):
@@ -272,12 +452,54 @@ class WS_CondNumeric(WS_Condition):
     def toJSon(self):
         return ConditionMaker.condNum(*self.mData)
 
+#===============================================
+class WS_CondZygScenario(WS_Condition):
+    def __init__(self, eval_space, scenario_seq, bit_arr):
+        WS_Condition.__init__(self, eval_space, "zyg-scenario", bit_arr,
+            detailed = False)
+        self.mScenarioSeq = scenario_seq
+
+    def toJSon(self):
+        eval_space = self.getEvalSpace()
+        return ConditionMaker.joinAnd([
+            ConditionMaker.condNum(eval_space.getZygUnit(idx).getName(),
+                *ZYG_BOUNDS_VAL[zyg_bounds])
+            for zyg_bounds, sample_idxs in self.mScenarioSeq
+            for idx in sample_idxs])
+
+#===============================================
+class WS_CondRegion(WS_Condition):
+    def __init__(self, eval_space, map_units, loci, bit_arr):
+        WS_Condition.__init__(self, eval_space, "region", bit_arr,
+            detailed = False)
+        self.mMapUnits = map_units
+        self.mLoci = loci
+
+    def toJSon(self):
+        seq = []
+        for chrom, start, end in self.mLoci:
+            cond = ConditionMaker.condEnum(self.mMapUnits["chrom"], [chrom])
+            if start is not None:
+                cond = ConditionMaker.joinAnd([cond,
+                    ConditionMaker.condNum(self.mMapUnits["start"],
+                        min_val = start, min_eq = True),
+                    ConditionMaker.condNum(self.mMapUnits["end"],
+                        max_val = end, max_eq = True)])
+            seq.append(cond)
+        return ConditionMaker.joinOr(seq)
+
 #===============================================
 class WS_CondEnum(WS_Condition):
     @classmethod
     def create(cls, unit_h, variants, filter_mode):
-        eval_func = WS_EvalSpace.enumFilterFunc(filter_mode,
-            unit_h.getVariantSet().makeIdxSet(variants))
+        data = (unit_h.getName(), variants, filter_mode)
+        base_idx_set = unit_h.getVariantSet().makeIdxSet(variants)
+        eval_func = WS_EvalSpace.enumFilterFunc(filter_mode, base_idx_set)
+        bit_arr, detailed = unit_h.getEvalSpace().makeUnitMaskCond(unit_h,
+            unit_h.evalEnumMask(filter_mode, base_idx_set, eval_func))
+        if bit_arr is not None:
+            return cls(unit_h.getEvalSpace(), None, None, data,
+                bit_arr, detailed)
         if unit_h.isDetailed():
             def fill_items_f(it_idx):
                 return eval_func(unit_h.getItemVal(it_idx))
@@ -286,12 +508,13 @@ class WS_CondEnum(WS_Condition):
             def fill_groups_f(rec_no):
                 return eval_func(unit_h.getRecVal(rec_no))
             fill_items_f = None
-        return cls(unit_h.getEvalSpace(), fill_groups_f, fill_items_f,
-            (unit_h.getName(), variants, filter_mode))
+        return cls(unit_h.getEvalSpace(), fill_groups_f, fill_items_f, data)
 
-    def __init__(self, eval_space, fill_groups_f, fill_items_f, data):
-        WS_Condition.__init__(self, eval_space, "enum",
-            fill_groups_f = fill_groups_f, fill_items_f = fill_items_f)
+    def __init__(self, eval_space, fill_groups_f, fill_items_f, data,
+            bit_arr = None, detailed = None):
+        WS_Condition.__init__(self, eval_space, "enum", bit_arr,
+            fill_groups_f = fill_groups_f, fill_items_f = fill_items_f,
+            detailed = detailed)
         self.mData = data
 
     def getData(self):
@@ -338,12 +561,13 @@ class _WS_Joiner(WS_Condition):
 
 #===============================================
 class WS_And(_WS_Joiner):
-    def __init__(self, items):
-        bit_arr = items[0].getBitArray().copy()
-        detailed = items[0].isDetailed()
-        for it in items[1:]:
-            bit_arr &= it.getBitArray()
-            detailed |= it.isDetailed()
+    def __init__(self, items, bit_arr = None, detailed = None):
+        if bit_arr is None:
+            bit_arr = items[0].getBitArray().copy()
+            detailed = items[0].isDetailed()
+            for it in items[1:]:
+                bit_arr &= it.getBitArray()
+                detailed |= it.isDetailed()
         _WS_Joiner.__init__(self, "and", items,  bit_arr, detailed)
 
     def toJSon(self):
@@ -359,17 +583,20 @@ class WS_And(_WS_Joiner):
             add_items = other.getItems()
         else:
             add_items = [other]
-        return WS_And(self.getItems() + add_items)
+        return WS_And(self.getItems() + add_items,
+            self.getBitArray() & other.getBitArray(),
+            self.isDetailed() or other.isDetailed())
 
 #===============================================
 #===============================================
 class WS_Or(_WS_Joiner):
-    def __init__(self, items):
-        bit_arr = items[0].getBitArray().copy()
-        detailed = items[0].isDetailed()
-        for it in items[1:]:
-            bit_arr |= it.getBitArray()
-            detailed |= it.isDetailed()
+    def __init__(self, items, bit_arr = None, detailed = None):
+        if bit_arr is None:
+            bit_arr = items[0].getBitArray().copy()
+            detailed = items[0].isDetailed()
+            for it in items[1:]:
+                bit_arr |= it.getBitArray()
+                detailed |= it.isDetailed()
         _WS_Joiner.__init__(self, "or", items,  bit_arr, detailed)
 
     def toJSon(self):
@@ -385,7 +612,9 @@ class WS_Or(_WS_Joiner):
             add_items = other.getItems()
         else:
             add_items = [other]
-        return WS_Or(self.getItems() + add_items)
+        return WS_Or(self.getItems() + add_items,
+            self.getBitArray() | other.getBitArray(),
+            self.isDetailed() or other.isDetailed())
 
 #===============================================
 class WS_None(WS_Condition, CondSupport_None):
@@ -21,6 +21,7 @@
 #import sys
 import abc
 from array import array
+from bisect import bisect_left, bisect_right
 from bitarray import bitarray
 
 from forome_tools.variants import VariantSet
@@ -28,7 +29,58 @@ from app.eval.var_unit import (VarUnit, NumUnitSupport, EnumUnitSupport,
     ReservedNumUnit)
 from app.eval.variety import VarietySupport
 from app.eval.condition import ConditionMaker
-from .val_stat import NumDiapStat, EnumStat
+from .val_stat import (EnumStat, collectNumStat, countSelected,
+    countSelectedPairs, expandPackCounts, countSelectedPackPairs)
+
+#===============================================
+# Bulk evaluation of condition masks: values of unit array are mapped
+# into bits by bitarray.encode() with code table evaluated once
+# per distinct value
+#===============================================
+sMaskCodes = (bitarray('0'), bitarray('1'))
+
+def encodeMask(val_array, code_table):
+    ret = bitarray()
+    ret.encode(code_table, val_array)
+    return ret
+
+def encodeIdxMask(val_array, value_seq, eval_func):
+    return encodeMask(val_array, {idx: sMaskCodes[eval_func(value)]
+        for idx, value in enumerate(value_seq)})
+
+def encodeNumMask(val_array, sorted_values,
+        min_val, min_eq, max_val, max_eq):
+    idx_from, idx_to = 0, len(sorted_values)
+    if min_val is not None:
+        idx_from = (bisect_left if min_eq else bisect_right)(
+            sorted_values, min_val)
+    if max_val is not None:
+        idx_to = (bisect_right if max_eq else bisect_left)(
+            sorted_values, max_val)
+    code_table = dict.fromkeys(sorted_values, sMaskCodes[0])
+    if idx_from < idx_to:
+        code_table.update(dict.fromkeys(
+            sorted_values[idx_from:idx_to], sMaskCodes[1]))
+    try:
+        return encodeMask(val_array, code_table)
+    except KeyError:
+        # NaN values are not found in code table
+        return None
+
+#===============================================
+class NumArrayMaskSupport:
+    def __init__(self, val_array):
+        self.mMaskArray = val_array
+        self.mSortedValues = None
+
+    def evalNumMask(self, min_val, min_eq, max_val, max_eq):
+        if self.mMaskArray is None:
+            return None
+        if self.mSortedValues is None:
+            self.mSortedValues = sorted(set(self.mMaskArray))
+        return encodeNumMask(self.mMaskArray, self.mSortedValues,
+            min_val, min_eq, max_val, max_eq)
+
 #===============================================
 class WS_Unit(VarUnit):
     def __init__(self, eval_space, unit_data,
@@ -48,8 +100,33 @@ class WS_Unit(VarUnit):
     def fillRecord(self, obj, rec_no):
         assert False
 
+    @abc.abstractmethod
+    def saveColumns(self, snap_out):
+        assert False
+
+    @abc.abstractmethod
+    def loadColumns(self, snap_in):
+        assert False
+
+    def evalNumMask(self, min_val, min_eq, max_val, max_eq):
+        return None
+
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        return None
+
+    @staticmethod
+    def _dumpPackSets(pack_set_seq):
+        return [sorted(idx_set) for idx_set in pack_set_seq]
+
+    @staticmethod
+    def _loadPackSets(pack_data):
+        pack_set_seq = [set(idx_seq) for idx_seq in pack_data]
+        pack_set_dict = {WS_MultiCompactUnit.makePackKey(idx_set): idx
+            for idx, idx_set in enumerate(pack_set_seq) if idx > 0}
+        return pack_set_seq, pack_set_dict
+
 #===============================================
-class WS_NumericValueUnit(WS_Unit, NumUnitSupport):
+class WS_NumericValueUnit(WS_Unit, NumUnitSupport, NumArrayMaskSupport):
     def __init__(self, eval_space, unit_data):
         WS_Unit.__init__(self, eval_space, unit_data, "numeric")
         assert self.getSubKind() in {"float", "int"}, (
@@ -57,19 +134,15 @@ class WS_NumericValueUnit(WS_Unit, NumUnitSupport):
             + " bad sub-kind: " + self.getSubKind())
         self._setScreened(unit_data["min"] is None)
         self.mArray = array("d" if self.getSubKind() == "float" else "q")
+        NumArrayMaskSupport.__init__(self, self.mArray)
 
     def getRecVal(self, rec_no):
         return self.mArray[rec_no]
 
     def makeStat(self, condition, eval_h, stat_ctx):
         ret_handle = self.prepareStat(stat_ctx)
-        num_stat = NumDiapStat()
-        for rec_no, _ in condition.iterSelection():
-            num_stat.regValue(self.mArray[rec_no])
-        builder_h = num_stat.prepareHistogram(self)
-        if builder_h.isOK():
-            for rec_no, _ in condition.iterSelection():
-                builder_h.regValue(self.mArray[rec_no])
+        num_stat, builder_h = collectNumStat(self,
+            self.mArray, condition.getRecMask())
         num_stat.reportResult(ret_handle, builder_h)
         return ret_handle
 
@@ -79,6 +152,12 @@ class WS_NumericValueUnit(WS_Unit, NumUnitSupport):
             + " rec_no = " + str(rec_no))
         self.mArray.append(inp_data.get(self.getInternalName()))
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+
 #===============================================
 class WS_EnumUnit(WS_Unit, EnumUnitSupport):
     def __init__(self, eval_space, unit_data, sub_kind = None):
@@ -96,11 +175,17 @@ class WS_EnumUnit(WS_Unit, EnumUnitSupport):
     def getVariantSet(self):
         return self.mVariantSet
 
+    @abc.abstractmethod
+    def countSelected(self, rec_mask):
+        return None
+
+    def evalGroupCounts(self, condition):
+        return self.countSelected(condition.getRecMask())
+
     def makeStat(self, condition, eval_h, stat_ctx):
         ret_handle = self.prepareStat(stat_ctx)
         enum_stat = EnumStat(self.mVariantSet)
-        for rec_no, _ in condition.iterSelection():
-            enum_stat.regValues(self.getRecVal((rec_no)))
+        enum_stat.regCounts(self.countSelected(condition.getRecMask()))
         enum_stat.reportResult(ret_handle)
         return ret_handle
 
@@ -113,6 +198,13 @@ class WS_StatusUnit(WS_EnumUnit):
     def getRecVal(self, rec_no):
         return {self.mArray[rec_no]}
 
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        return encodeIdxMask(self.mArray,
+            [{idx} for idx, _ in enumerate(self.mVariantSet)], eval_func)
+
+    def countSelected(self, rec_mask):
+        return countSelected(self.mArray, rec_mask)
+
     def fillRecord(self, inp_data, rec_no):
         assert len(self.mArray) == rec_no, (
             "Bad record length for "  + self.getName()
@@ -123,6 +215,12 @@ class WS_StatusUnit(WS_EnumUnit):
             f"Improper value {value} for unit {self.getName()}")
         self.mArray.append(idx)
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+
 #===============================================
 class WS_MultiSetUnit(WS_EnumUnit):
     def __init__(self, eval_space, unit_data):
@@ -140,6 +238,25 @@ class WS_MultiSetUnit(WS_EnumUnit):
     def _setRecBit(self, rec_no, idx, value):
         self.mArraySeq[idx][rec_no] = value
 
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        if len(base_idx_set) == 0:
+            return None
+        ret = None
+        for idx in base_idx_set:
+            if ret is None:
+                ret = self.mArraySeq[idx].copy()
+            elif filter_mode == "AND":
+                ret &= self.mArraySeq[idx]
+            else:
+                ret |= self.mArraySeq[idx]
+        if filter_mode == "NOT":
+            ret.invert()
+        return ret
+
+    def countSelected(self, rec_mask):
+        return {var_no: (bit_arr & rec_mask).count()
+            for var_no, bit_arr in enumerate(self.mArraySeq)}
+
     def fillRecord(self, inp_data, rec_no):
         values = inp_data.get(self.getInternalName())
         if values:
@@ -149,6 +266,16 @@ class WS_MultiSetUnit(WS_EnumUnit):
         for var_no in range(len(self.mArraySeq)):
             self.mArraySeq[var_no].append(var_no in idx_set)
 
+    def saveColumns(self, snap_out):
+        for var_no, bit_arr in enumerate(self.mArraySeq):
+            snap_out.putBitArray(
+                f"{self.getInternalName()}#{var_no}", bit_arr)
+
+    def loadColumns(self, snap_in):
+        self.mArraySeq = [
+            snap_in.getBitArray(f"{self.getInternalName()}#{var_no}")
+            for var_no in range(len(self.mArraySeq))]
+
 #===============================================
 class WS_MultiCompactUnit(WS_EnumUnit):
     def __init__(self, eval_space, unit_data):
@@ -160,6 +287,13 @@ class WS_MultiCompactUnit(WS_EnumUnit):
     def getRecVal(self, rec_no):
         return self.mPackSetSeq[self.mArray[rec_no]]
 
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        return encodeIdxMask(self.mArray, self.mPackSetSeq, eval_func)
+
+    def countSelected(self, rec_mask):
+        return expandPackCounts(
+            countSelected(self.mArray, rec_mask), self.mPackSetSeq)
+
     @staticmethod
     def makePackKey(idx_set):
         return '#'.join(map(str, sorted(idx_set)))
@@ -181,14 +315,26 @@ class WS_MultiCompactUnit(WS_EnumUnit):
             + " rec_no = " + str(rec_no))
         self.mArray.append(idx)
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+        snap_out.putData(self.getInternalName() + "#packs",
+            self._dumpPackSets(self.mPackSetSeq))
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+        self.mPackSetSeq, self.mPackSetDict = self._loadPackSets(
+            snap_in.getData(self.getInternalName() + "#packs"))
+
 #===============================================
-class WS_TranscriptNumericValueUnit(WS_Unit, NumUnitSupport):
+class WS_TranscriptNumericValueUnit(WS_Unit, NumUnitSupport,
+        NumArrayMaskSupport):
     def __init__(self, eval_space, unit_data):
         WS_Unit.__init__(self, eval_space, unit_data, "numeric")
         assert self.getSubKind() in {"transcript-float", "transcript-int"}, (
             "For "  + self.getName() + " bad sub-kind:" + self.getSubKind())
         self._setScreened(unit_data["min"] is None)
         self.mArray = array("d" if self.getSubKind() == "float" else "q")
+        NumArrayMaskSupport.__init__(self, self.mArray)
         self.mDefaultValue = unit_data["default"]
 
     def isDetailed(self):
@@ -199,13 +345,9 @@ class WS_TranscriptNumericValueUnit(WS_Unit, NumUnitSupport):
 
     def makeStat(self, condition, eval_h, stat_ctx):
         ret_handle = self.prepareStat(stat_ctx)
-        num_stat = NumDiapStat(True)
-        for group_no, it_idx in condition.iterItemIdx():
-            num_stat.regValue([self.mArray[it_idx]], group_no)
-        builder_h = num_stat.prepareHistogram(self)
-        if builder_h.isOK():
-            for _, it_idx in condition.iterItemIdx():
-                builder_h.regValue([self.mArray[it_idx]])
+        num_stat, builder_h = collectNumStat(self,
+            self.mArray, condition.getBitArray(), detailed = True,
+            group_count = condition.getRecMask().count())
         num_stat.reportResult(ret_handle, builder_h)
         ret_handle["detailed"] = True
         return ret_handle
@@ -217,6 +359,12 @@ class WS_TranscriptNumericValueUnit(WS_Unit, NumUnitSupport):
         else:
             self.mArray.append(self.mDefaultValue)
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+
 #===============================================
 class WS_TranscriptStatusUnit(WS_Unit, EnumUnitSupport):
     def __init__(self, eval_space, unit_data, unit_tp = None):
@@ -249,6 +397,13 @@ class WS_TranscriptStatusUnit(WS_Unit, EnumUnitSupport):
     def getItValIdx(self, item_idx):
         return self.mArray[item_idx]
 
+    def getItValArray(self):
+        return self.mArray
+
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        return encodeIdxMask(self.mArray,
+            [{idx} for idx, _ in enumerate(self.mVariantSet)], eval_func)
+
     def fillRecord(self, inp_data, rec_no):
         values = inp_data.get(self.getInternalName())
         if not values:
@@ -260,12 +415,26 @@ class WS_TranscriptStatusUnit(WS_Unit, EnumUnitSupport):
             self.mArray.extend([self.mVariantSet.indexOf(str(value))
                 for value in values])
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+
+    def evalGroupCounts(self, condition):
+        return countSelectedPairs(self.getEvalSpace().getItemGroupArray(),
+            self.mArray, condition.getBitArray())
+
     def makeStat(self, condition, eval_h, stat_ctx):
         ret_handle = self.prepareStat(stat_ctx)
         enum_stat = EnumStat(self.mVariantSet, detailed = True)
-        for group_no, it_idx in condition.iterItemIdx():
-            enum_stat.regValues([self.mArray[it_idx]], group_no = group_no,
-                transcript_id = self.getEvalSpace().mapTranscriptID(it_idx))
+        sel_bits = condition.getBitArray()
+        eval_space = self.getEvalSpace()
+        enum_stat.regCounts(countSelected(self.mArray, sel_bits),
+            countSelectedPairs(eval_space.getItemGroupArray(),
+                self.mArray, sel_bits),
+            countSelectedPairs(eval_space.getTranscriptIdArray(),
+                self.mArray, sel_bits))
         enum_stat.reportResult(ret_handle)
         ret_handle["detailed"] = True
         return ret_handle
@@ -293,6 +462,9 @@ class WS_TranscriptMultisetUnit(WS_Unit, EnumUnitSupport):
     def getItemVal(self, item_idx):
         return self.mPackSetSeq[self.mArray[item_idx]]
 
+    def evalEnumMask(self, filter_mode, base_idx_set, eval_func):
+        return encodeIdxMask(self.mArray, self.mPackSetSeq, eval_func)
+
     def _fillOne(self, values):
         if values:
             idx_set = self.mVariantSet.makeIdxSet(values)
@@ -314,13 +486,32 @@ class WS_TranscriptMultisetUnit(WS_Unit, EnumUnitSupport):
             for values in seq:
                 self._fillOne(values)
 
+    def saveColumns(self, snap_out):
+        snap_out.putArray(self.getInternalName(), self.mArray)
+        snap_out.putData(self.getInternalName() + "#packs",
+            self._dumpPackSets(self.mPackSetSeq))
+
+    def loadColumns(self, snap_in):
+        snap_in.loadArray(self.getInternalName(), self.mArray)
+        self.mPackSetSeq, self.mPackSetDict = self._loadPackSets(
+            snap_in.getData(self.getInternalName() + "#packs"))
+
+    def evalGroupCounts(self, condition):
+        return countSelectedPackPairs(
+            self.getEvalSpace().getItemGroupArray(),
+            self.mArray, condition.getBitArray(), self.mPackSetSeq)
+
     def makeStat(self, condition, eval_h, stat_ctx):
         ret_handle = self.prepareStat(stat_ctx)
         enum_stat = EnumStat(self.mVariantSet, detailed = True)
-        for group_no, it_idx in condition.iterItemIdx():
-            enum_stat.regValues(self.mPackSetSeq[self.mArray[it_idx]],
-                group_no = group_no,
-                transcript_id = self.getEvalSpace().mapTranscriptID(it_idx))
+        sel_bits = condition.getBitArray()
+        eval_space = self.getEvalSpace()
+        enum_stat.regCounts(expandPackCounts(
+            countSelected(self.mArray, sel_bits), self.mPackSetSeq),
+            countSelectedPackPairs(eval_space.getItemGroupArray(),
+                self.mArray, sel_bits, self.mPackSetSeq),
+            countSelectedPackPairs(eval_space.getTranscriptIdArray(),
+                self.mArray, sel_bits, self.mPackSetSeq))
         enum_stat.reportResult(ret_handle)
         ret_handle["detailed"] = True
         return ret_handle
@@ -395,9 +586,11 @@ def loadWS_Unit(eval_space, unit_data):
     return WS_MultiSetUnit(eval_space, unit_data)
 
 #===============================================
-class WS_ReservedNumUnit(ReservedNumUnit):
-    def __init__(self, eval_space, name, rec_func, sub_kind = "int"):
+class WS_ReservedNumUnit(ReservedNumUnit, NumArrayMaskSupport):
+    def __init__(self, eval_space, name, rec_func, sub_kind = "int",
+            val_array = None):
         ReservedNumUnit.__init__(self, eval_space, name, sub_kind)
+        NumArrayMaskSupport.__init__(self, val_array)
         self.mRecFunc = rec_func
 
     def getRecVal(self, rec_no):
@@ -53,10 +53,9 @@ class FilterZoneH(ZoneH):
     def getVariantList(self):
         return list(iter(self.mUnit.getVariantSet()))
 
-    def getRestrictF(self, variants):
-        cond = self.getDS().getEvalSpace().makeEnumCond(
-            self.mUnit, variants)
-        return lambda rec_no: cond.recInSelection(rec_no)
+    def getRestrictMask(self, variants):
+        return self.getDS().getEvalSpace().makeEnumCond(
+            self.mUnit, variants).getRecMask()
 
 #===============================================
 class PanelZoneH(ZoneH):
@@ -72,13 +71,9 @@ class PanelZoneH(ZoneH):
         return [pname
             for pname, _ in self.mVarietyUnit.iterPanels()]
 
-    def inVariants(self, rec_no, variants):
-        v_idx_set = self.mVarietyUnit.getRecVal(rec_no)
-        rec_names = self.mVarietyUnit.getVariantSet().makeValueSet(v_idx_set)
-        for pname, names in self.mVarietyUnit.iterPanels():
-            if pname in variants and len(rec_names & set(names)) > 0:
-                return True
-        return False
-
-    def getRestrictF(self, variants):
-        return lambda rec_no: self.inVariants(rec_no, variants)
+    def getRestrictMask(self, variants):
+        eval_space = self.getDS().getEvalSpace()
+        svariants = self.mPanelUnit.mapVariants(variants)
+        if len(svariants) == 0:
+            return eval_space.getCondNone().getRecMask()
+        return self.mVarietyUnit.makeBaseCond(svariants, "OR").getRecMask()
@@ -18,7 +18,12 @@
 #  limitations under the License.
 #
 
+import json
+from threading import Lock
+from cachetools import TTLCache
+
 from forome_tools.rest import RestAgent
+from app.config.a_config import AnfisaConfig
 #===============================================
 class DruidAgent:
     GRANULARITY = "all"
@@ -30,16 +35,60 @@ class DruidAgent:
         "sql":   "http://localhost:8888/druid/v2/sql",
         "coord": "http://localhost:8081/druid/coordinator/v1"}
 
-    def __init__(self, config):
+    def __init__(self, config, cache_mode = False):
         druid_cfg = config.get("druid", dict())
         self.mRestAgents = {mode: RestAgent(druid_cfg.get(mode, url), mode)
             for mode, url in self.sDefaultUrls.items()}
         self.mVaultPrefix = druid_cfg["vault-prefix"]
+        self.mQueryCache = None
+        self.mCacheLock = Lock()
+        self.mCacheCounts = {"hits": 0, "misses": 0, "drops": 0}
+        if cache_mode and AnfisaConfig.configOption("druid.cache.size") > 0:
+            self.mQueryCache = TTLCache(
+                AnfisaConfig.configOption("druid.cache.size"),
+                AnfisaConfig.configOption("druid.cache.ttl"))
 
     def call(self, mode, request_data, method = "POST",
             add_path = "", calm_mode = False):
-        return self.mRestAgents[mode].call(request_data, method, add_path,
+        # scan pages are not cached: they are large and used once
+        if (self.mQueryCache is None or mode != "query"
+                or method != "POST" or add_path
+                or request_data.get("queryType") == "scan"):
+            return self.mRestAgents[mode].call(request_data, method,
+                add_path, calm_mode = calm_mode)
+        key = (request_data.get("dataSource"),
+            json.dumps(request_data, sort_keys = True))
+        with self.mCacheLock:
+            ret = self.mQueryCache.get(key)
+            if ret is not None:
+                self.mCacheCounts["hits"] += 1
+                return ret
+            self.mCacheCounts["misses"] += 1
+        ret = self.mRestAgents[mode].call(request_data, method, add_path,
             calm_mode = calm_mode)
+        if ret is not None:
+            with self.mCacheLock:
+                self.mQueryCache[key] = ret
+        return ret
+
+    def dropDataSetCache(self, ds_name):
+        if self.mQueryCache is None:
+            return
+        data_source = self.normDataSetName(ds_name)
+        with self.mCacheLock:
+            for key in [key for key in self.mQueryCache.keys()
+                    if key[0] == data_source]:
+                self.mQueryCache.pop(key, None)
+                self.mCacheCounts["drops"] += 1
+
+    def reportCacheStat(self):
+        if self.mQueryCache is None:
+            return None
+        with self.mCacheLock:
+            ret = dict(self.mCacheCounts)
+            ret["size"] = len(self.mQueryCache)
+            ret["max-size"] = self.mQueryCache.maxsize
+        return ret
 
     def normDataSetName(self, ds_name):
         if not self.mVaultPrefix:
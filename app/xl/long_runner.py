@@ -17,14 +17,19 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-from threading import Condition
+import logging
+from threading import Condition, Lock
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from forome_tools.job_pool import ExecutionTask
 from forome_tools.log_err import logException
 from app.config.a_config import AnfisaConfig
 #===============================================
 class XL_LongRunner_DTreeCounts(ExecutionTask):
+    sPointPool = None
+    sPointPoolLock = Lock()
+
     def __init__(self, ds_h, rq_id, dtree_h, point_idxs = None):
         ExecutionTask.__init__(self, "dtree-counts")
         self.mDS = ds_h
@@ -35,6 +40,9 @@ class XL_LongRunner_DTreeCounts(ExecutionTask):
         self.mFailureCount = 0
         self.mNextPointIdxs = []
         self.mTimeAccess = datetime.now()
+        self.mCancelled = False
+        self.mMetrics = {"points": 0, "failures": 0,
+            "max-parallel": 0, "eval-time": 0., "total-time": None}
         for idx in (range(len(dtree_h))
                 if point_idxs is None else point_idxs):
             if dtree_h.pointNotActive(idx):
@@ -42,50 +50,105 @@ class XL_LongRunner_DTreeCounts(ExecutionTask):
             else:
                 self.mNextPointIdxs.append(idx)
 
+    @classmethod
+    def _getPointPool(cls):
+        with cls.sPointPoolLock:
+            if cls.sPointPool is None:
+                cls.sPointPool = ThreadPoolExecutor(
+                    max_workers = AnfisaConfig.configOption(
+                        "long.run.pool.threads"),
+                    thread_name_prefix = "dtree-point")
+        return cls.sPointPool
+
     def getTaskType(self):
         return "dtree-counts"
 
     def outOfDate(self, cur_datetime):
+        # runner in work is out of date also if nobody asks for it
+        with self.mDS:
+            return (cur_datetime - self.mTimeAccess
+                > AnfisaConfig.configOption("long.run.passtime"))
+
+    def cancel(self):
         with self.mDS:
-            return (self.mCondition is None
-                and cur_datetime - self.mTimeAccess
-                    > AnfisaConfig.cconfigOption("long.run.passtime"))
+            self.mCancelled = True
+
+    def getMetrics(self):
+        with self.mDS:
+            return dict(self.mMetrics)
+
+    def _evalPoint(self, idx):
+        time_start = datetime.now()
+        counts = self.mDS.getEvalSpace().evalTotalCounts(
+            self.mDTreeH.getActualCondition(idx))
+        return counts, (datetime.now() - time_start).total_seconds()
+
+    def _startPoints(self, point_pool, in_work):
+        # points are started in order of priority, up to the limit
+        max_parallel = AnfisaConfig.configOption("long.run.threads")
+        for idx in self.mNextPointIdxs:
+            if len(in_work) >= max_parallel:
+                break
+            if idx in in_work.values() or self.mCounts[idx] is not None:
+                continue
+            in_work[point_pool.submit(self._evalPoint, idx)] = idx
+        self.mMetrics["max-parallel"] = max(
+            self.mMetrics["max-parallel"], len(in_work))
 
     def execIt(self):
+        time_start = datetime.now()
+        point_pool = self._getPointPool()
+        in_work = dict()
         while True:
             with self.mDS:
-                if len(self.mNextPointIdxs) == 0:
+                if self.mCancelled:
+                    break
+                self._startPoints(point_pool, in_work)
+                if len(in_work) == 0:
                     break
-                idx = self.mNextPointIdxs[0]
-            try:
-                with self.mCondition:
-                    self.mCondition.notify_all()
-                counts = self.mDS.getEvalSpace().evalTotalCounts(
-                    self.mDTreeH.getActualCondition(idx))
-            except Exception as err:
-                logException("Long run exception in DS=%s"
-                    % self.mDS.getName())
-                self.mFailureCount += 1
-                if self.mFailureCount > AnfisaConfig.configOption(
-                        "long.run.failures"):
-                    raise err
-                else:
+            done, _ = wait(list(in_work.keys()),
+                return_when = FIRST_COMPLETED)
+            for future in done:
+                idx = in_work.pop(future)
+                try:
+                    counts, eval_time = future.result()
+                except Exception as err:
+                    logException("Long run exception in DS=%s"
+                        % self.mDS.getName())
+                    self.mFailureCount += 1
+                    self.mMetrics["failures"] += 1
+                    if self.mFailureCount > AnfisaConfig.configOption(
+                            "long.run.failures"):
+                        self._finishUp(in_work, time_start)
+                        raise err
                     continue
-            with self.mDS:
-                self.mTimeAccess = datetime.now()
-                self.mCounts[idx] = counts
-                if counts[0] == 0 and self.mDTreeH.checkZeroAfter(idx):
-                    for idx1 in range(idx, len(self.mCounts)):
-                        self.mCounts[idx1] = counts[:]
-                for j, pcounts in enumerate(self.mCounts):
-                    if pcounts is not None and j in self.mNextPointIdxs:
-                        self.mNextPointIdxs.remove(j)
+                with self.mDS:
+                    self.mMetrics["points"] += 1
+                    self.mMetrics["eval-time"] += eval_time
+                    self.mCounts[idx] = counts
+                    if counts[0] == 0 and self.mDTreeH.checkZeroAfter(idx):
+                        for idx1 in range(idx, len(self.mCounts)):
+                            self.mCounts[idx1] = counts[:]
+                    self.mNextPointIdxs = [j for j in self.mNextPointIdxs
+                        if self.mCounts[j] is None]
+                    with self.mCondition:
+                        self.mCondition.notify_all()
+        self._finishUp(in_work, time_start)
+        return False
 
+    def _finishUp(self, in_work, time_start):
+        for future in in_work.keys():
+            future.cancel()
         with self.mDS:
             with self.mCondition:
                 self.mCondition.notify_all()
             self.mCondition = None
-        return False
+            self.mMetrics["total-time"] = (
+                datetime.now() - time_start).total_seconds()
+            logging.info("DTree counts in DS=%s%s: %s" % (self.mDS.getName(),
+                " (cancelled)" if self.mCancelled else "",
+                " ".join("%s=%s" % (key, str(val))
+                    for key, val in sorted(self.mMetrics.items()))))
 
     def getEvaluatedCounts(self, next_points = None, time_end = None):
         condition = None
@@ -107,4 +107,5 @@ class XLDataset(DataSet):
                 if runner.outOfDate(cur_datetime):
                     to_remove.append(rq_id)
             for rq_id in to_remove:
+                self.mLongRunners[rq_id].cancel()
                 del self.mLongRunners[rq_id]
@@ -18,6 +18,12 @@
 #  limitations under the License.
 #
 
+import json
+from hashlib import md5
+from threading import Lock, Event
+from cachetools import LRUCache
+
+from app.config.a_config import AnfisaConfig
 from app.eval.eval_space import (EvalSpace, Eval_Condition,
     CondSupport_None, CondSupport_All)
 from app.eval.var_unit import ReservedNumUnit
@@ -30,6 +36,10 @@ class XL_EvalSpace(EvalSpace):
         self.mTotalCounts = [ds_h.getTotal()]
         self.mNoHistogram = (
             ds_h.getApp().getOption("druid.no.histogram") is True)
+        self.mNumDiapCache = LRUCache(
+            AnfisaConfig.configOption("xl.num.stat.cache.size"))
+        self.mNumDiapLock = Lock()
+        self.mNumDiapLoading = dict()
 
         self.mRandRUnit = ReservedNumUnit(self, "_rand")
         self._addReservedUnit(self.mRandRUnit)
@@ -75,6 +85,62 @@ class XL_EvalSpace(EvalSpace):
     def noHistogram(self):
         return self.mNoHistogram
 
+    def condContentKey(self, condition):
+        return md5(bytes(json.dumps(condition.getDruidRepr(),
+            sort_keys = True), encoding = "utf-8")).hexdigest()
+
+    def getNumUnitDiap(self, unit_h, condition):
+        cond_repr = None if condition is None else condition.getDruidRepr()
+        if cond_repr is False:
+            return None, None, 0
+        key = json.dumps(cond_repr, sort_keys = True)
+        while True:
+            with self.mNumDiapLock:
+                diap_dict = self.mNumDiapCache.get(key)
+                if diap_dict is not None:
+                    return diap_dict[unit_h.getName()]
+                load_evt = self.mNumDiapLoading.get(key)
+                owner_mode = load_evt is None
+                if owner_mode:
+                    load_evt = Event()
+                    self.mNumDiapLoading[key] = load_evt
+            if owner_mode:
+                break
+            # the same query is in progress in another thread
+            load_evt.wait()
+        try:
+            diap_dict = self._evalNumDiaps(cond_repr)
+            with self.mNumDiapLock:
+                self.mNumDiapCache[key] = diap_dict
+        finally:
+            with self.mNumDiapLock:
+                del self.mNumDiapLoading[key]
+            load_evt.set()
+        return diap_dict[unit_h.getName()]
+
+    def _evalNumDiaps(self, cond_repr):
+        # min/max/count of all numeric units in one timeseries query
+        num_units = [unit_h for unit_h in self.iterUnits()
+            if unit_h.getUnitKind() == "numeric"]
+        aggregations = []
+        for idx, unit_h in enumerate(num_units):
+            aggregations += unit_h.makeDiapAggregations("__%d" % idx)
+        query = {
+            "queryType": "timeseries",
+            "dataSource": self.mDruidAgent.normDataSetName(self.getName()),
+            "granularity": self.mDruidAgent.GRANULARITY,
+            "descending": "true",
+            "aggregations": aggregations,
+            "intervals": [self.mDruidAgent.INTERVAL]}
+        if cond_repr is not None:
+            query["filter"] = cond_repr
+        ret = self.mDruidAgent.call("query", query)
+        assert len(ret) == 1
+        result = ret[0]["result"]
+        return {unit_h.getName(): tuple(result["__%d%s" % (idx, nm)]
+                for nm in ("_min", "_max", "_count"))
+            for idx, unit_h in enumerate(num_units)}
+
     def makeNumericCond(self, unit_h, min_val = None, min_eq = True,
             max_val = None, max_eq = True,  zyg_bounds = None):
         if min_val is not None or max_val is not None:
@@ -140,54 +206,66 @@ class XL_EvalSpace(EvalSpace):
         assert len(ret) == 1
         return [int(it["value"]) for it in ret[0]["result"]]
 
-    def evalRecSeq(self, condition, expect_count):
+    def iterRecScan(self, condition, columns = ("_ord",)):
+        # scan query: hits are streamed page by page without
+        # aggregation and ordering on broker side
         if condition is None:
             cond_repr = None
         else:
             cond_repr = condition.getDruidRepr()
             if cond_repr is False:
-                return []
+                return
+        page_size = AnfisaConfig.configOption("xl.scan.page.size")
         query = {
-            "queryType": "topN",
+            "queryType": "scan",
             "dataSource": self.mDruidAgent.normDataSetName(self.getName()),
-            "dimension": "_ord",
-            "threshold": expect_count + 5,
-            "metric": "count",
-            "granularity": self.mDruidAgent.GRANULARITY,
-            "aggregations": [{
-                "type": "count", "name": "count",
-                "fieldName": "_ord"}],
+            "resultFormat": "compactedList",
+            "columns": list(columns),
+            "limit": page_size,
             "intervals": [self.mDruidAgent.INTERVAL]}
         if cond_repr is not None:
             query["filter"] = cond_repr
-        ret = self.mDruidAgent.call("query", query)
-        assert len(ret) == 1
-        assert len(ret[0]["result"]) == expect_count
-        return [int(it["_ord"]) for it in ret[0]["result"]]
+        offset = 0
+        while True:
+            query["offset"] = offset
+            cnt = 0
+            for segment_ret in self.mDruidAgent.call("query", query):
+                col_idxs = [segment_ret["columns"].index(name)
+                    for name in columns]
+                for evt in segment_ret["events"]:
+                    yield tuple(int(evt[idx]) for idx in col_idxs)
+                    cnt += 1
+            if cnt < page_size:
+                return
+            offset += page_size
+
+    def evalRecSeq(self, condition, expect_count):
+        ret = [rec_no for rec_no, in self.iterRecScan(condition)]
+        assert len(ret) == expect_count, (
+            f"Record count conflict: {len(ret)}/{expect_count}")
+        return ret
 
     def evalSampleList(self, condition, max_count):
-        if condition is None:
-            cond_repr = None
-        else:
-            cond_repr = condition.getDruidRepr()
-            if cond_repr is False:
-                return []
-        query = {
-            "queryType": "topN",
-            "dataSource": self.mDruidAgent.normDataSetName(self.getName()),
-            "dimension": "_ord",
-            "threshold": max_count,
-            "metric": "max_rand",
-            "granularity": self.mDruidAgent.GRANULARITY,
-            "aggregations": [{
-                "type": "longMax", "name": "max_rand",
-                "fieldName": "_rand"}],
-            "intervals": [self.mDruidAgent.INTERVAL]}
-        if cond_repr is not None:
-            query["filter"] = cond_repr
-        ret = self.mDruidAgent.call("query", query)
-        assert len(ret) == 1
-        return [int(it["_ord"]) for it in ret[0]["result"]]
+        total = self.evalTotalCounts(condition)[0]
+        if total == 0:
+            return []
+        # _rand is crc32 of record key, so it is uniform on 32-bit range:
+        # scan only records with _rand above the bound that keeps twice
+        # the required count, extend the range if it is not enough
+        share = 2. * max_count / total
+        while True:
+            if share >= 1.:
+                scan_cond = condition
+            else:
+                rand_cond = self.makeNumericCond(self.mRandRUnit,
+                    min_val = int((1. - share) * 0x100000000))
+                scan_cond = (rand_cond if condition is None
+                    else self.joinAnd([condition, rand_cond]))
+            rand_seq = sorted(self.iterRecScan(scan_cond, ("_rand", "_ord")),
+                reverse = True)
+            if len(rand_seq) >= max_count or share >= 1.:
+                return [rec_no for _, rec_no in rand_seq[:max_count]]
+            share *= 2
 
 #===============================================
 class XL_Condition(Eval_Condition):
@@ -43,6 +43,20 @@ class XL_NumUnit(XL_Unit, NumUnitSupport):
         XL_Unit.__init__(self, eval_space, descr, "numeric")
         self.mDruidKind = "float" if self.getSubKind() == "float" else "long"
 
+    def makeDiapAggregations(self, prefix = "_"):
+        return [
+            {
+                "type": "count", "name": prefix + "_count",
+                "fieldName": self.getInternalName()},
+            {
+                "type": "%sMin" % self.mDruidKind,
+                "name": prefix + "_min",
+                "fieldName": self.getInternalName()},
+            {
+                "type": "%sMax" % self.mDruidKind,
+                "name": prefix + "_max",
+                "fieldName": self.getInternalName()}]
+
     def _makeQuery(self, druid_agent, condition):
         query = {
             "queryType": "timeseries",
@@ -50,18 +64,7 @@ class XL_NumUnit(XL_Unit, NumUnitSupport):
                 self.getEvalSpace().getName()),
             "granularity": druid_agent.GRANULARITY,
             "descending": "true",
-            "aggregations": [
-                {
-                    "type": "count", "name": "__count",
-                    "fieldName": self.getInternalName()},
-                {
-                    "type": "%sMin" % self.mDruidKind,
-                    "name": "__min",
-                    "fieldName": self.getInternalName()},
-                {
-                    "type": "%sMax" % self.mDruidKind,
-                    "name": "__max",
-                    "fieldName": self.getInternalName()}],
+            "aggregations": self.makeDiapAggregations(),
             "intervals": [druid_agent.INTERVAL]}
         if condition is not None:
             cond_repr = condition.getDruidRepr()
@@ -119,16 +122,15 @@ class XL_NumUnit(XL_Unit, NumUnitSupport):
         return h_info
 
     def makeStat(self, condition, eval_h, stat_ctx):
-        druid_agent = self.getEvalSpace().getDruidAgent()
-        query = self._makeQuery(druid_agent, condition)
-        if query is not None:
-            rq = druid_agent.call("query", query)
-            v_min, v_max, count = [rq[0]["result"][nm] for nm in
-                ("__min", "__max", "__count")]
-        else:
-            v_min, v_max, count = None, None, 0
-        h_info = self._prepareHistogram(
-            druid_agent, query, v_min, v_max, count)
+        # count/min/max come from the query shared by all numeric units,
+        # so only the sketch query is made for the unit itself
+        v_min, v_max, count = self.getEvalSpace().getNumUnitDiap(
+            self, condition)
+        h_info = None
+        if count > 0:
+            druid_agent = self.getEvalSpace().getDruidAgent()
+            h_info = self._prepareHistogram(druid_agent,
+                self._makeQuery(druid_agent, condition), v_min, v_max, count)
         ret_handle = self.prepareStat(stat_ctx)
         ret_handle["counts"] = [count]
         if h_info is not None:
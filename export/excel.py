@@ -26,6 +26,7 @@ import os
 from copy import copy
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from jsonpath_rw import parse
 
 
@@ -151,20 +152,28 @@ def _setStyle(cell, style):
 
 class ExcelExport:
     def __init__(self, template_file, tags_info = None,
-            source_versions = None, verbose_mode = False):
+            source_versions = None, verbose_mode = False,
+            write_only = False):
         self.mapping, self.check_tags_mapping = read_mappings(
             template_file, verbose_mode)
         self.workbook = None
         self.column_widths = {}
         self.tags_info = None
         self.check_group_tab = None
+        self.write_only = write_only
+        self.variant_sheet = None
+        self.row_count = 0
+        self.cur_group_idx = None
         self.add_tags_cfg(tags_info)
         if verbose_mode:
             for column in range(len(self.mapping)):
                 logging.info("Column %s: %s"
                     % (column, self.mapping[column]))
-        self.workbook = openpyxl.Workbook()
-        self._createVariantSheet()
+        self.workbook = openpyxl.Workbook(write_only = write_only)
+        if write_only:
+            self._createStreamVariantSheet()
+        else:
+            self._createVariantSheet()
         self._createVersionSheet(source_versions)
         self._createKeySheet()
 
@@ -185,16 +194,68 @@ class ExcelExport:
             self.column_widths[cell.column] = len(cell.value)
         ws.freeze_panes = 'D2'
 
+    def _row_width(self):
+        return len(self.mapping) + 4
+
+    def _stream_cell(self, value, style = None):
+        cell = WriteOnlyCell(self.variant_sheet, value = value)
+        _setStyle(cell, style)
+        return cell
+
+    def _stream_row(self, row):
+        self.variant_sheet.append(row)
+        self.row_count += 1
+
+    def _createStreamVariantSheet(self):
+        # write-only mode: column widths are defined by titles only,
+        # since they must be set up before the first row
+        ws = self.workbook.create_sheet("Variants")
+        self.variant_sheet = ws
+        row = [None] * self._row_width()
+        for column, key, value, style, _ in self.mapping:
+            if not value:
+                continue
+            row[column - 1] = self._stream_cell(key, style)
+            self.column_widths[column] = len(key)
+        for idx, title in enumerate(
+                ["check tags", "tags", "tags with values", "notes"]):
+            row[len(self.mapping) + idx] = title
+            self.column_widths[len(self.mapping) + 1 + idx] = len(title)
+        for column, width in self.column_widths.items():
+            ws.column_dimensions[
+                openpyxl.utils.get_column_letter(column)].width = min(
+                    12, width + 2)
+        ws.freeze_panes = 'D2'
+        self._stream_row(row)
+
     def _createVersionSheet(self, source_versions):
         ws = self.workbook.create_sheet("version")
         if source_versions:
             for idx, pair in enumerate(source_versions):
+                if self.write_only:
+                    ws.append(pair[:2])
+                    continue
                 ws.cell(row=idx + 1, column = 1, value = pair[0])
                 ws.cell(row=idx + 1, column = 2, value = pair[1])
 
     def _createKeySheet(self):
         ws = self.workbook.create_sheet("key")
-        for idx, title in enumerate(["Column", "Definition", "Mapping"]):
+        titles = ["Column", "Definition", "Mapping"]
+        if self.write_only:
+            for idx in range(len(titles)):
+                ws.column_dimensions[
+                    openpyxl.utils.get_column_letter(idx + 1)].width = 50
+            ws.freeze_panes = 'A2'
+            ws.append(titles)
+            for row, key, value, style, def_value in self.mapping:
+                if not value:
+                    ws.append([None])
+                    continue
+                cell = WriteOnlyCell(ws, value = value)
+                _setStyle(cell, style)
+                ws.append([cell, def_value, key])
+            return
+        for idx, title in enumerate(titles):
             ws.cell(row = 1, column = idx + 1, value = title)
             ws.column_dimensions[
                 openpyxl.utils.get_column_letter(idx + 1)].width = 50
@@ -214,9 +275,7 @@ class ExcelExport:
         self.check_group_tab = [0] * (len(self.tags_info['check-tags'])
             + len(self.tags_info['op-tags']) + 2)
 
-    def reg_check_group(self, tags):
-        if self.check_group_tab is None:
-            return None, None
+    def _eval_check_group(self, tags):
         group_idx = None
         group_name = None
         if tags is None:
@@ -242,10 +301,26 @@ class ExcelExport:
                     break
         if group_idx is None:
             group_idx = len(self.check_group_tab) - 1
+        return group_idx, group_name
+
+    def reg_check_group(self, tags):
+        if self.check_group_tab is None:
+            return None, None
+        group_idx, group_name = self._eval_check_group(tags)
         self.check_group_tab[group_idx] += 1
         return group_name, 1 + sum(self.check_group_tab[:group_idx + 1])
 
+    def order_variants(self, tags_seq):
+        # write-only mode requires variants ordered by check groups
+        if self.check_group_tab is None:
+            return list(range(len(tags_seq)))
+        return sorted(range(len(tags_seq)),
+            key = lambda idx: self._eval_check_group(tags_seq[idx])[0])
+
     def add_variant(self, data, tags = None):
+        if self.write_only:
+            self._stream_variant(data, tags)
+            return
         ws = self.workbook.active
         tag_group_name, new_row = self.reg_check_group(tags)
         if new_row is None:
@@ -263,8 +338,50 @@ class ExcelExport:
         if tags is not None and self.tags_info is not None:
             self.__add_tags_to_excel(tags, new_row, tag_group_name)
 
-    def __add_tags_to_excel(self, tags, row, tag_group_name):
-        ws = self.workbook.active
+    def _stream_group(self, group_idx):
+        if self.check_group_tab is None or group_idx == self.cur_group_idx:
+            return
+        assert (self.cur_group_idx is None
+            or group_idx > self.cur_group_idx), (
+            "Variants are not ordered by check groups")
+        if group_idx == len(self.check_group_tab) - 1:
+            style = None
+            if self.cur_group_idx is None:
+                self.cur_group_idx = group_idx
+                return
+        else:
+            if group_idx >= len(self.tags_info['check-tags']):
+                group_name = "_mix"
+            else:
+                group_name = self.tags_info['check-tags'][group_idx]
+            style = self.check_tags_mapping.get(group_name)
+        self.cur_group_idx = group_idx
+        self._stream_row([self._stream_cell(None, style)
+            for _ in range(len(self.mapping) + 1)])
+
+    def _stream_variant(self, data, tags):
+        tag_group_name = None
+        if self.check_group_tab is not None:
+            group_idx, tag_group_name = self._eval_check_group(tags)
+            self.check_group_tab[group_idx] += 1
+            self._stream_group(group_idx)
+        row = [None] * self._row_width()
+        for column, _, key, style, _ in self.mapping:
+            if not key:
+                continue
+            row[column - 1] = self._stream_cell(
+                self.__to_excel(build_value(data, key)), style)
+        if tags is not None and self.tags_info is not None:
+            for idx, value in enumerate(self._tags_values(tags)):
+                row[len(self.mapping) + idx] = value
+            style = self._group_style(tag_group_name)
+            for idx in range(len(self.mapping) + 1):
+                if not isinstance(row[idx], openpyxl.cell.Cell):
+                    row[idx] = self._stream_cell(row[idx])
+                _setStyle(row[idx], style)
+        self._stream_row(row)
+
+    def _tags_values(self, tags):
         check_tags, op_tags, tags_with_value = [], [], []
         for tg in self.tags_info['check-tags']:
             if tags.get(tg) is True:
@@ -282,24 +399,26 @@ class ExcelExport:
         note_value = tags.get("_note")
         if not note_value:
             note_value = ""
-        for idx, value in enumerate([
-                ', '.join(check_tags),
-                ', '.join(op_tags),
-                ', '.join(tags_with_value), note_value]):
+        return [', '.join(check_tags), ', '.join(op_tags),
+            ', '.join(tags_with_value), note_value]
+
+    def _group_style(self, tag_group_name):
+        if not tag_group_name:
+            return None
+        if tag_group_name in self.check_tags_mapping:
+            return self.check_tags_mapping[tag_group_name]
+        if tag_group_name == "_mix":
+            return self.check_tags_mapping["Multiple Tags"]
+        return self.check_tags_mapping["Custom"]
+
+    def __add_tags_to_excel(self, tags, row, tag_group_name):
+        ws = self.workbook.active
+        for idx, value in enumerate(self._tags_values(tags)):
             cell = ws.cell(row = row, column = len(self.mapping) + 1 + idx,
                 value = value)
             self.column_widths[cell.column] = max(
                 self.column_widths[cell.column], len(value))
-
-        if tag_group_name:
-            if tag_group_name in self.check_tags_mapping:
-                style = self.check_tags_mapping[tag_group_name]
-            elif tag_group_name == "_mix":
-                style = self.check_tags_mapping["Multiple Tags"]
-            else:
-                style = self.check_tags_mapping["Custom"]
-        else:
-            style = None
+        style = self._group_style(tag_group_name)
         for idx in range(len(self.mapping) + 1):
             _setStyle(ws.cell(row = row, column = idx + 1), style)
 
@@ -327,6 +446,12 @@ class ExcelExport:
                 self.check_tags_mapping.get(group_name))
 
     def save(self, file):
+        if self.write_only:
+            self.variant_sheet.auto_filter.ref = ('A1:'
+                + openpyxl.utils.get_column_letter(self._row_width())
+                + str(self.row_count))
+            self.workbook.save(filename=file)
+            return
         ws = self.workbook.active
         self._decor_lines(ws)
         for column, width in self.column_widths.items():
@@ -0,0 +1,87 @@
+#  Copyright (c) 2019. Partners HealthCare and other members of
+#  Forome Association
+#
+#  Developed by Sergey Trifonov based on contributions by Joel Krier,
+#  Michael Bouzinier, Shamil Sunyaev and other members of Division of
+#  Genetics, Brigham and Women's Hospital
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import os, tempfile, unittest
+import openpyxl
+
+from export.excel import ExcelExport
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))),
+    "export", "SEQaBOO_output_template_20190317.xlsx")
+
+TAGS_INFO = {
+    "check-tags": ["Previously categorized", "False positives"],
+    "op-tags": ["_note", "Custom_tag"]}
+
+RECORDS = [
+    ({"genes": "BRCA1", "seq_region_name": "17", "start": 100},
+        {"False positives": True}),
+    ({"genes": "TP53", "seq_region_name": "17", "start": 200},
+        None),
+    ({"genes": "APOB", "seq_region_name": "2", "start": 300},
+        {"Previously categorized": True, "_note": "checked"}),
+    ({"genes": "LDLR", "seq_region_name": "19", "start": 400},
+        {"Custom_tag": "value"})]
+
+
+class ExcelStreamTest(unittest.TestCase):
+
+    def _export(self, write_only):
+        export_h = ExcelExport(TEMPLATE, tags_info = TAGS_INFO,
+            write_only = write_only)
+        tags_seq = [tags for _, tags in RECORDS]
+        for idx in export_h.order_variants(tags_seq):
+            export_h.add_variant(*RECORDS[idx])
+        with tempfile.TemporaryDirectory() as dir_path:
+            fpath = os.path.join(dir_path, "export.xlsx")
+            export_h.save(fpath)
+            wb = openpyxl.load_workbook(fpath)
+            rows = [[cell.value for cell in row]
+                for row in wb["Variants"].iter_rows()]
+            wb.close()
+        return export_h, rows
+
+    def test_write_only_with_tags(self):
+        export_h, rows = self._export(True)
+        tag_col = len(export_h.mapping)
+        data_rows = [row for row in rows[1:] if row[0] is not None]
+        self.assertEqual(len(RECORDS), len(data_rows))
+        self.assertEqual(["APOB", "BRCA1", "LDLR", "TP53"],
+            [row[0] for row in data_rows])
+        by_gene = {row[0]: row for row in data_rows}
+        self.assertEqual("False positives", by_gene["BRCA1"][tag_col])
+        self.assertEqual("Previously categorized",
+            by_gene["APOB"][tag_col])
+        self.assertEqual("checked", by_gene["APOB"][tag_col + 3])
+        self.assertEqual("Custom_tag", by_gene["LDLR"][tag_col + 1])
+        self.assertEqual("Custom_tag: value", by_gene["LDLR"][tag_col + 2])
+
+    def test_same_as_regular(self):
+        _, stream_rows = self._export(True)
+        _, regular_rows = self._export(False)
+        self.assertEqual(
+            [row for row in regular_rows if any(row)],
+            [row for row in stream_rows if any(row)])
+
+
+if __name__ == '__main__':
+    unittest.main()
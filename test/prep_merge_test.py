@@ -0,0 +1,288 @@
+#  Copyright (c) 2019. Partners HealthCare and other members of
+#  Forome Association
+#
+#  Developed by Sergey Trifonov based on contributions by Joel Krier,
+#  Michael Bouzinier, Shamil Sunyaev and other members of Division of
+#  Genetics, Brigham and Women's Hospital
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json, unittest
+
+from app.model.sol_pack import SolutionPack
+from app.prepare.prep_filters import FilterPrepareSetH
+from app.prepare.prep_unit import (IntConvertor, FloatConvertor,
+    EnumConvertor, TranscriptNumConvertor, TranscriptStatusConvertor,
+    PresenceConvertor, PanelConvertor, VarietyConvertor,
+    TranscriptMultiConvertor, TranscriptPanelsConvertor)
+from app.prepare.v_check import AttrTypeChecker, DictTypeChecker
+
+PANELS = {
+    "Cardio": ["APOB", "LDLR", "PCSK9"],
+    "Cancer": ["BRCA1", "BRCA2", "TP53"]}
+
+
+class _Master:
+    def __init__(self, ds_kind):
+        self.mDSKind = ds_kind
+
+    def getDSKind(self):
+        return self.mDSKind
+
+    def iterStdItems(self, item_kind):
+        if item_kind == "panel.Symbol":
+            for name, data in PANELS.items():
+                yield {"name": name, "data": data}
+
+
+class _VarRegistry:
+    def __init__(self, var_types):
+        self.mVarTypes = var_types
+
+    def getVarInfo(self, name):
+        return self.mVarTypes[name], None
+
+
+if "MERGE_TEST" not in SolutionPack.sPacks:
+    _TEST_PACK = SolutionPack("MERGE_TEST")
+    for _name, _data in PANELS.items():
+        _TEST_PACK.regPanel(_name, "Symbol", items = _data)
+
+VAR_TYPES = {"num": "numeric", "Symbol": "enum", "Presence": "enum",
+    "Panels": "enum", "Variety": "enum", "Variety_name": "enum",
+    "Variety_panel": "enum", "tr_gene": "enum", "tr_cons": "enum",
+    "tr_panels": "enum"}
+
+
+def _makeFilterSet():
+    filter_set = FilterPrepareSetH(
+        {"data_schema": "MERGE_TEST", "versions": {}},
+        _VarRegistry(VAR_TYPES), "ws", check_identifiers = False)
+    filter_set.intValueUnit("num", "/num", default_value = 0)
+    symbol_h = filter_set.multiStatusUnit("Symbol", "/genes")
+    filter_set.presenceUnit("Presence", [("In_A", "/a"), ("In_B", "/b")])
+    filter_set.panelsUnit("Panels", symbol_h, "Symbol")
+    filter_set.varietyUnit("Variety", "Variety_name", "Variety_panel",
+        "/genes", "Symbol")
+    tr_gene_h = filter_set.transcriptStatusUnit("tr_gene", "gene",
+        default_value = None)
+    filter_set.transcriptMultisetUnit("tr_cons", "cons",
+        variants = ["missense", "synonymous", "intron"])
+    filter_set.transcriptPanelsUnit("tr_panels", tr_gene_h, "Symbol")
+    return filter_set
+
+
+NUM_VALUES = [[1], [], ["7"], [3, 4], ["bad"], [-2], [12], [5], [0]]
+FLOAT_VALUES = [[0.5], [], [2.25], ["x"], [-1.5], [1e-3], [7]]
+ENUM_VALUES = [["A"], ["B"], [], ["C"], ["A", "B"], ["Z"], ["B"], ["A"]]
+TR_VALUES = [3, "5", 1.0, 8, 2, "-4"]
+ATTR_VALUES = [1, 2.5, "str", None, [1, 2], {"a": 1}, 7, [], "x"]
+DICT_VALUES = [{"a": 1, "b": "x"}, {"a": 2}, {"c": [1, 2]},
+    "not-a-dict", {"b": None, "d": 3.5}, {"c": [], "a": "y"}]
+PRESENCE_RECORDS = [{"a": 1}, {"b": "x"}, {}, {"a": True, "b": 2},
+    {"a": 0, "b": None}, {"b": [1]}, {"a": "y"}]
+GENE_VALUES = [["TP53"], [], ["APOB", "BRCA1"], ["XYZ"], ["LDLR"],
+    ["BRCA2", "TP53"], ["PCSK9", "XYZ"]]
+TR_CONS_VALUES = [["missense"], [], ["intron", "missense"], None,
+    ["synonymous"], ["missense", "intron"]]
+TR_GENE_VALUES = ["TP53", "APOB", None, "XYZ", "LDLR", "BRCA2"]
+RECORDS = [
+    {"num": 3, "genes": ["TP53"], "a": 1,
+        "_view": {"transcripts": [
+            {"gene": "TP53", "cons": ["missense"]},
+            {"gene": "TP53", "cons": ["intron"]}]}},
+    {"num": 12, "genes": ["APOB", "LDLR"], "b": True,
+        "_view": {"transcripts": [
+            {"gene": "APOB", "cons": ["synonymous", "intron"]}]}},
+    {"genes": [], "_view": {"transcripts": []}},
+    {"num": "bad", "genes": ["XYZ"], "a": 1, "b": 1,
+        "_view": {"transcripts": [{"gene": "XYZ", "cons": []}]}},
+    {"num": 5, "genes": ["BRCA1", "PCSK9"],
+        "_view": {"transcripts": [
+            {"gene": "BRCA1", "cons": ["missense"]},
+            {"gene": "PCSK9"}]}}]
+
+
+def _portions(values, size):
+    return [values[idx:idx + size] for idx in range(0, len(values), size)]
+
+
+class PrepMergeTest(unittest.TestCase):
+
+    def _checkMerge(self, make_f, reg_f, values, result_f):
+        """
+        Collector merged from portions of values must be equal to
+        collector that processed all values in single pass
+        """
+        single = make_f()
+        for rec_no, val in enumerate(values):
+            reg_f(single, rec_no, val)
+        expected = result_f(single)
+        for size in (1, 2, 3, len(values)):
+            merged, rec_no = None, 0
+            for portion in _portions(values, size):
+                part = make_f()
+                for val in portion:
+                    reg_f(part, rec_no, val)
+                    rec_no += 1
+                if merged is None:
+                    merged = part
+                else:
+                    merged.merge(part)
+            self.assertEqual(expected, result_f(merged))
+
+            merged = make_f()
+            for portion_no, portion in enumerate(_portions(values, size)):
+                part = make_f()
+                for idx, val in enumerate(portion):
+                    reg_f(part, portion_no * size + idx, val)
+                state = json.loads(json.dumps(part.getPrepState()))
+                merged.mergePrepState(state)
+            self.assertEqual(expected, result_f(merged))
+
+    def test_numeric(self):
+        self._checkMerge(
+            lambda: IntConvertor(None, "num", "/num", 0, None,
+                0, [-5, 10], None),
+            lambda unit, rec_no, val: unit.convert(val, rec_no),
+            NUM_VALUES, lambda unit: unit.dump())
+        self._checkMerge(
+            lambda: FloatConvertor(None, "fnum", "/fnum", 0, None,
+                0., None, None),
+            lambda unit, rec_no, val: unit.convert(val, rec_no),
+            FLOAT_VALUES, lambda unit: unit.dump())
+
+    def test_enum(self):
+        for sub_kind in ("status", "multi"):
+            self._checkMerge(
+                lambda: EnumConvertor(None, "en", "/en", 0, None, None,
+                    sub_kind, variants = ["A", "B", "C"],
+                    default_value = "A"),
+                lambda unit, rec_no, val: unit.convert(val, rec_no),
+                ENUM_VALUES, lambda unit: unit.dump())
+
+    def test_transcript(self):
+        self._checkMerge(
+            lambda: TranscriptNumConvertor(_Master("ws"), "tr", 0, None,
+                "transcript-int", "tr_num", 0),
+            lambda unit, rec_no, val: unit.processOne(val),
+            TR_VALUES, lambda unit: [unit.dump(), unit.isOK()])
+        self._checkMerge(
+            lambda: TranscriptStatusConvertor(_Master("ws"), "trs", 0,
+                None, None, "transcript-status", "tr_st",
+                ["1", "2", "3"], None),
+            lambda unit, rec_no, val: unit.processOne(val),
+            [1, "2", 3, 4, [1]], lambda unit: [unit.dump(), unit.isOK()])
+
+    def test_presence(self):
+        self._checkMerge(
+            lambda: PresenceConvertor(_Master("ws"), "pres", 0, None,
+                [("In_A", "/a"), ("In_B", "/b")]),
+            lambda unit, rec_no, rec: unit.process(rec_no, rec, dict()),
+            PRESENCE_RECORDS, lambda unit: unit.dump())
+
+    def test_panels(self):
+        self._checkMerge(
+            lambda: PanelConvertor(_Master("ws"), "panels", 0, None,
+                None, "Symbol", "Symbol", None),
+            lambda unit, rec_no, genes: unit.process(rec_no, None,
+                {"Symbol": genes}),
+            GENE_VALUES, lambda unit: unit.dump())
+        self._checkMerge(
+            lambda: TranscriptPanelsConvertor(_Master("ws"), "tr_panels",
+                0, None, None, "gene", "Symbol", None),
+            lambda unit, rec_no, val: unit.processOne(val),
+            TR_GENE_VALUES, lambda unit: [unit.dump(), unit.isOK()])
+
+    def test_variety(self):
+        self._checkMerge(
+            lambda: VarietyConvertor(_Master("ws"), "variety", 0, None,
+                "Variety_name", "Variety_panel", "/genes", "Symbol"),
+            lambda unit, rec_no, val: unit.convert(val, rec_no),
+            GENE_VALUES, lambda unit: unit.dump())
+
+    def test_transcript_multi(self):
+        def make_f():
+            return TranscriptMultiConvertor(_Master("ws"), "tr_cons", 0,
+                None, None, "transcript-multiset", "cons",
+                ["missense", "synonymous", "intron"], None)
+
+        self._checkMerge(make_f,
+            lambda unit, rec_no, val: unit.processOne(val),
+            TR_CONS_VALUES, lambda unit: [unit.dump(), unit.isOK()])
+        self._checkMerge(make_f,
+            lambda unit, rec_no, val: unit.processOne(val),
+            TR_CONS_VALUES + [["frameshift"], ["intron"]],
+            lambda unit: [unit.dump(), unit.isOK()])
+
+    def test_transcript_not_ok(self):
+        """
+        Failed transcript portion makes merged unit failed
+        in any order of merge
+        """
+        for unit_class, args, ok_values, bad_value in [
+                (TranscriptStatusConvertor,
+                    (None, "transcript-status", "tr_st", ["1", "2"], None),
+                    [1, "2"], 3),
+                (TranscriptMultiConvertor,
+                    (None, "transcript-multiset", "tr_cons",
+                        ["missense", "intron"], None),
+                    [["missense"], ["intron"]], ["frameshift"])]:
+            def make_f(values):
+                unit = unit_class(_Master("ws"), "tr", 0, None, *args)
+                for val in values:
+                    unit.processOne(val)
+                return unit
+
+            bad_unit = make_f([bad_value])
+            self.assertFalse(bad_unit.isOK())
+            for first, second in ((ok_values, [bad_value]),
+                    ([bad_value], ok_values)):
+                merged = make_f(first)
+                merged.merge(make_f(second))
+                self.assertFalse(merged.isOK())
+                merged = make_f(first)
+                merged.mergePrepState(json.loads(json.dumps(
+                    make_f(second).getPrepState())))
+                self.assertFalse(merged.isOK())
+            merged = make_f(ok_values[:1])
+            merged.merge(make_f(ok_values[1:]))
+            self.assertTrue(merged.isOK())
+
+    def test_filter_set(self):
+        self._checkMerge(_makeFilterSet,
+            lambda filter_set, rec_no, rec: filter_set.process(
+                rec_no, rec, None),
+            RECORDS, lambda filter_set: filter_set.dump())
+
+    def test_attr_checker(self):
+        def result_f(checker):
+            return [checker.getPrepState(), checker.fixType()]
+
+        self._checkMerge(lambda: AttrTypeChecker("attr"),
+            lambda checker, rec_no, val: checker.regValue(rec_no, val),
+            ATTR_VALUES, result_f)
+        self._checkMerge(
+            lambda: AttrTypeChecker("attr", expect_type = "dict"),
+            lambda checker, rec_no, val: checker.regValue(rec_no, val),
+            ATTR_VALUES, result_f)
+
+    def test_dict_checker(self):
+        self._checkMerge(lambda: DictTypeChecker("dict", ""),
+            lambda checker, rec_no, val: checker.regValue(rec_no, val),
+            DICT_VALUES, lambda checker: checker.getPrepState())
+
+
+if __name__ == '__main__':
+    unittest.main()